@@ -0,0 +1,105 @@
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from PyQt5.QtCore import QRect  # noqa: E402
+from PyQt5.QtWidgets import QLabel, QWidget  # noqa: E402
+
+from hendjibi.model.dac import DataManager  # noqa: E402
+from hendjibi.model.entry import EntryType, ProgressStatus  # noqa: E402
+from hendjibi.model.sorting import SortOrder  # noqa: E402
+from hendjibi.pyqt.qt_layout import FlowLayout  # noqa: E402
+from hendjibi.pyqt.widgets import MainWidget, POPULATE_CHUNK_SIZE  # noqa: E402
+
+FLOW_LAYOUT_ITEMS = 500
+
+
+def populate(main_widget):
+    # drains the population the event loop would otherwise stream in
+    while main_widget.population_done < main_widget.population_total:
+        main_widget._populate_batch(POPULATE_CHUNK_SIZE)
+    main_widget.population_timer.stop()
+
+
+@pytest.fixture
+def data_manager(library_path):
+    data_manager = DataManager(library_path)
+    yield data_manager
+    data_manager.backend.close()
+    data_manager.covers.close()
+
+
+@pytest.fixture
+def main_widget(qt_app, config, data_manager):
+    main_widget = MainWidget(config, data_manager)
+    populate(main_widget)
+    yield main_widget
+    main_widget.thumbnail_loader.shutdown()
+    main_widget.deleteLater()
+
+
+@pytest.mark.benchmark(group='main_widget')
+def bench_main_widget_load_with_data(benchmark, qt_app, config, data_manager):
+    def load():
+        main_widget = MainWidget(config, data_manager)
+        populate(main_widget)
+        main_widget.thumbnail_loader.shutdown()
+        main_widget.deleteLater()
+        qt_app.processEvents()
+    benchmark.pedantic(load, rounds=5)
+
+
+@pytest.mark.benchmark(group='main_widget')
+def bench_filter_type_toggle(benchmark, main_widget):
+    def toggle():
+        main_widget.filter_type_changed(EntryType.MANGA.value, True)
+        main_widget.filter_type_changed(EntryType.MANGA.value, False)
+    benchmark(toggle)
+
+
+@pytest.mark.benchmark(group='main_widget')
+def bench_filter_status_toggle(benchmark, main_widget):
+    def toggle():
+        main_widget.filter_status_changed(ProgressStatus.DROPPED.value, True)
+        main_widget.filter_status_changed(ProgressStatus.DROPPED.value, False)
+    benchmark(toggle)
+
+
+@pytest.mark.benchmark(group='main_widget')
+def bench_sort_order_switch(benchmark, main_widget):
+    # both indexes already exist, only the views are reordered
+    main_widget.set_sort_order(SortOrder.TITLE)
+
+    def switch():
+        main_widget.set_sort_order(SortOrder.RELEASE_DATE)
+        main_widget.set_sort_order(SortOrder.TITLE)
+    benchmark(switch)
+
+
+@pytest.fixture
+def flow_layout(qt_app):
+    parent = QWidget()
+    layout = FlowLayout(parent)
+    for index in range(FLOW_LAYOUT_ITEMS):
+        label = QLabel(F'Entry {index}')
+        label.setFixedSize(100 + index % 7 * 10, 150)
+        layout.addWidget(label)
+    yield layout
+    parent.deleteLater()
+
+
+@pytest.mark.benchmark(group='flow_layout')
+def bench_flow_layout_cold(benchmark, flow_layout):
+    def layout():
+        flow_layout.invalidate()
+        return flow_layout._do_layout(QRect(0, 0, 1200, 0))
+    assert benchmark(layout) > 0
+
+
+@pytest.mark.benchmark(group='flow_layout')
+def bench_flow_layout_resize(benchmark, flow_layout):
+    widths = iter(range(600, 10 ** 9, 7))
+
+    def layout():
+        return flow_layout._do_layout(QRect(0, 0, next(widths), 0))
+    assert benchmark(layout) > 0
@@ -0,0 +1,164 @@
+import itertools
+import pickle
+import shutil
+
+import pytest
+
+from hendjibi.model.dac import DataManager
+from hendjibi.model.filters import Attr, Range
+from hendjibi.model.entry import EntryType, ProgressStatus
+
+# an empty journal has to be copied too, without it the first load rewrites the snapshot
+LIBRARY_SUFFIXES = ('', '.covers', '.journal')
+
+
+@pytest.fixture
+def library_copy(tmp_path, library_path):
+    # load benchmarks must not write into the shared library
+    return copy_library(library_path, tmp_path)
+
+
+def copy_library(library_path, directory):
+    for suffix in LIBRARY_SUFFIXES:
+        shutil.copy(F'{library_path}{suffix}', directory / F'entries.data{suffix}')
+    return str(directory / 'entries.data')
+
+
+@pytest.mark.benchmark(group='data_manager')
+def bench_data_manager_load(benchmark, library_copy):
+    def load():
+        data_manager = DataManager(library_copy)
+        data_manager.backend.close()
+        data_manager.covers.close()
+        return data_manager
+    data_manager = benchmark(load)
+    assert data_manager.all_entries
+
+
+@pytest.mark.benchmark(group='data_manager')
+def bench_data_manager_save(benchmark, library_copy):
+    data_manager = DataManager(library_copy)
+    benchmark(data_manager.compact)
+    data_manager.close()
+
+
+@pytest.mark.benchmark(group='data_manager')
+def bench_data_manager_autosave(benchmark, library_copy):
+    data_manager = DataManager(library_copy)
+    entry = data_manager.all_entries[0]
+
+    def autosave():
+        data_manager.add_one_progress(entry)
+        return data_manager.autosave()
+    assert benchmark(autosave)
+    data_manager.close()
+
+
+@pytest.mark.benchmark(group='data_manager')
+def bench_data_manager_autosave_snapshot(benchmark, library_copy):
+    # without a journal every autosave has to write the whole library
+    data_manager = DataManager(library_copy, journaled=False)
+    entry = data_manager.all_entries[0]
+
+    def autosave():
+        data_manager.add_one_progress(entry)
+        return data_manager.autosave()
+    assert benchmark(autosave)
+    data_manager.close()
+
+
+@pytest.mark.benchmark(group='data_manager')
+def bench_sqlite_migrate_and_load(benchmark, tmp_path, library_path):
+    rounds = itertools.count()
+
+    def migrate():
+        directory = tmp_path / str(next(rounds))
+        directory.mkdir()
+        data_manager = DataManager(copy_library(library_path, directory), backend='sqlite')
+        data_manager.close()
+        return data_manager
+    assert benchmark.pedantic(migrate, rounds=3).all_entries
+
+
+@pytest.mark.benchmark(group='entry_pickle')
+def bench_entry_pickle_dumps(benchmark, entries):
+    data = benchmark(pickle.dumps, entries)
+    assert len(pickle.loads(data)) == len(entries)
+
+
+@pytest.mark.benchmark(group='entry_pickle')
+def bench_entry_pickle_loads(benchmark, entries):
+    data = pickle.dumps(entries)
+    assert len(benchmark(pickle.loads, data)) == len(entries)
+
+
+@pytest.mark.benchmark(group='queries')
+def bench_filter_index_build(benchmark, entries):
+    from hendjibi.model.filters import FilterIndex
+    benchmark(FilterIndex, entries)
+
+
+@pytest.mark.benchmark(group='queries')
+def bench_filter_query(benchmark, entries):
+    from hendjibi.model.filters import FilterIndex
+    index = FilterIndex(entries)
+    query = (Attr('entry_type', EntryType.MANGA) | Attr('entry_type', EntryType.ANIME)) & \
+        ~Attr('progress_status', ProgressStatus.DROPPED) & Range('progress', 10, 200)
+    assert benchmark(index.select, query)
+
+
+@pytest.mark.benchmark(group='queries')
+def bench_search(benchmark, entries):
+    from hendjibi.model.search import SearchIndex
+    index = SearchIndex()
+    for entry in entries:
+        index.add(entry)
+    benchmark(index.search, 'drgon sword')
+
+
+@pytest.mark.benchmark(group='queries')
+def bench_sort_index_build(benchmark, entries):
+    from hendjibi.model.sorting import SortedIndex, SortOrder
+    benchmark(SortedIndex, SortOrder.TITLE, entries)
+
+
+@pytest.mark.benchmark(group='queries')
+def bench_sort_index_update(benchmark, entries):
+    from hendjibi.model.sorting import SortedIndex, SortOrder
+    index = SortedIndex(SortOrder.PROGRESS, entries)
+    entry = entries[len(entries) // 2]
+
+    def update():
+        entry.progress += 1
+        return index.update(entry)
+    benchmark(update)
+
+
+@pytest.fixture
+def duplicate_data_manager(library_copy):
+    pytest.importorskip('numpy')
+    pytest.importorskip('PyQt5.QtGui')
+    data_manager = DataManager(library_copy)
+    # hashes every cover once, across worker processes
+    data_manager.duplicate_finder
+    yield data_manager
+    data_manager.close()
+
+
+@pytest.mark.benchmark(group='duplicates')
+def bench_duplicate_check(benchmark, duplicate_data_manager):
+    from hendjibi.model.entry import GenericEntry
+    existing = duplicate_data_manager.all_entries[len(duplicate_data_manager.all_entries) // 2]
+    new_entry = GenericEntry(cover_image=bytes(duplicate_data_manager.get_cover(existing)),
+                             title_english=existing.title_english)
+    assert benchmark(duplicate_data_manager.find_duplicates, new_entry)
+
+
+@pytest.mark.benchmark(group='duplicates')
+def bench_duplicate_scan(benchmark, library_copy, tmp_path):
+    pytest.importorskip('numpy')
+    pytest.importorskip('PyQt5.QtGui')
+    from hendjibi.model.duplicates import build_finder
+    data_manager = DataManager(library_copy)
+    benchmark.pedantic(lambda: build_finder(data_manager.all_entries, data_manager.covers).groups(), rounds=3)
+    data_manager.close()
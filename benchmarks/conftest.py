@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+
+# the GUI benchmarks run without a display
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import build_library, generate_entries  # noqa: E402
+
+BENCH_ENTRIES = int(os.environ.get('HENDJIBI_BENCH_ENTRIES', 5000))
+
+
+@pytest.fixture(scope='session')
+def entry_count():
+    return BENCH_ENTRIES
+
+
+@pytest.fixture(scope='session')
+def entries(entry_count):
+    return list(generate_entries(entry_count, with_covers=False))
+
+
+@pytest.fixture(scope='session')
+def library_path(tmp_path_factory, entry_count):
+    return build_library(str(tmp_path_factory.mktemp('library')), entry_count)
+
+
+@pytest.fixture(scope='session')
+def qt_app():
+    QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    yield app
+
+
+@pytest.fixture
+def config(tmp_path, library_path):
+    from hendjibi.tools.config import ConfigManager
+    config_manager = ConfigManager(str(tmp_path))
+    config_manager.data_dump_path = library_path
+    # no autosave or config writes while measuring
+    config_manager.autosave_interval = 0
+    config_manager.thumbnail_cache_mb = 0
+    yield config_manager
+    config_manager.flush()
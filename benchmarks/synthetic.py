@@ -0,0 +1,120 @@
+"""Deterministic synthetic libraries for the benchmarks.
+
+Every entry type and progress status is represented, titles are made of random
+syllables and covers are real PNG (and, when PyQt5 is available, JPEG) images of
+typical cover dimensions, so the blob store, thumbnails and pickles see realistic
+sizes. The same seed always produces the same library.
+"""
+import os
+import random
+import struct
+import zlib
+from datetime import date
+
+from hendjibi.model.dac import DataManager
+from hendjibi.model.entry import GenericEntry, EntryType, ProgressStatus, EntryStatus
+
+DEFAULT_SEED = 1337
+COVER_WIDTH = 225
+COVER_HEIGHT = 320
+# distinct covers per library, entries share them like editions of a series do
+COVER_POOL_SIZE = 128
+SYLLABLES = ('ka', 'shi', 'to', 'na', 'mi', 'ro', 'yu', 'ki', 'ha', 'ne', 'mo', 'ri', 'sa', 'ten', 'gen', 'ryu',
+             'ko', 'no', 'chi', 'ai', 'sora', 'hoshi', 'kaze', 'yume')
+WORDS = ('the', 'of', 'in', 'last', 'first', 'hero', 'world', 'school', 'sword', 'night', 'summer', 'sky', 'story',
+         'tower', 'dragon', 'girl', 'boy', 'magic', 'city', 'sea', 'game', 'love', 'war', 'star')
+COVER_BLOCKS = (6, 8)
+# low amplitude noise keeps zlib at compression ratios close to real artwork
+NOISE = bytes((value & 0x1F) for value in range(256))
+
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def make_png(rng, width=COVER_WIDTH, height=COVER_HEIGHT):
+    # large colour blocks give the low frequency structure perceptual hashes look at, noise the texture
+    row_size = width * 3
+    block_width = -(-width // COVER_BLOCKS[0])
+    block_height = -(-height // COVER_BLOCKS[1])
+    rows = []
+    for block_row in range(COVER_BLOCKS[1]):
+        row = b''.join(rng.randbytes(3) * block_width for _ in range(COVER_BLOCKS[0]))[:row_size]
+        rows.append(row * min(block_height, height - block_row * block_height))
+    blocks = b''.join(rows)
+    noise = rng.randbytes(row_size * height).translate(NOISE)
+    pixels = (int.from_bytes(blocks, 'big') ^ int.from_bytes(noise, 'big')).to_bytes(len(blocks), 'big')
+    raw = b''.join(b'\x00' + pixels[row * row_size:(row + 1) * row_size] for row in range(height))
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', header) + _png_chunk(b'IDAT', zlib.compress(raw, 6)) +
+            _png_chunk(b'IEND', b''))
+
+
+def make_jpeg(png_data):
+    # Qt is imported lazily so the model benchmarks run without it, PNG is kept when it is missing
+    try:
+        from PyQt5.QtCore import QBuffer, QIODevice
+        from PyQt5.QtGui import QImage
+    except ImportError:
+        return png_data
+    image = QImage.fromData(png_data)
+    buffer = QBuffer()
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, 'JPG', 85)
+    return bytes(buffer.data())
+
+
+def make_covers(rng, count=COVER_POOL_SIZE):
+    covers = []
+    for index in range(count):
+        png_data = make_png(rng, COVER_WIDTH + rng.randrange(-25, 26), COVER_HEIGHT + rng.randrange(-40, 41))
+        covers.append(make_jpeg(png_data) if index % 2 else png_data)
+    return covers
+
+
+def make_title(rng, words=WORDS):
+    return ' '.join(rng.choice(words) for _ in range(rng.randint(2, 6))).capitalize()
+
+
+def make_original_title(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 8))).capitalize()
+
+
+def generate_entries(count, seed=DEFAULT_SEED, with_covers=True, cover_pool_size=COVER_POOL_SIZE):
+    rng = random.Random(seed)
+    covers = make_covers(rng, cover_pool_size) if with_covers else [b'']
+    entry_types = list(EntryType)
+    progress_statuses = list(ProgressStatus)
+    entry_statuses = list(EntryStatus)
+    first_day = date(1980, 1, 1).toordinal()
+    for index in range(count):
+        release_date1 = date.fromordinal(first_day + rng.randrange(16000))
+        max_progress = rng.randint(0, 500)
+        yield GenericEntry(
+            cover_image=covers[index % len(covers)],
+            title_english=make_title(rng),
+            title_original=make_original_title(rng),
+            synonyms=make_original_title(rng) if rng.random() < 0.3 else '',
+            release_date1=release_date1,
+            release_date2=date.fromordinal(release_date1.toordinal() + rng.randrange(2000)),
+            entry_status=rng.choice(entry_statuses),
+            description=' '.join(make_title(rng) for _ in range(rng.randint(0, 8))),
+            nsfw=rng.random() < 0.1,
+            # cycling keeps every type and status present even in small libraries
+            entry_type=entry_types[index % len(entry_types)],
+            progress=rng.randint(0, max_progress),
+            max_progress=max_progress,
+            progress_status=progress_statuses[(index // len(entry_types)) % len(progress_statuses)],
+        )
+
+
+def build_library(directory, count, seed=DEFAULT_SEED, with_covers=True, **data_manager_options):
+    """Writes a library of ``count`` entries to ``directory`` and returns its data file path."""
+    os.makedirs(directory, exist_ok=True)
+    file_path = os.path.join(directory, 'entries.data')
+    data_manager = DataManager(file_path, **data_manager_options)
+    data_manager.add_entries(list(generate_entries(count, seed, with_covers)), compact=False)
+    # the cases open the library with different storage options, the entries go into the snapshot itself
+    data_manager.compact()
+    data_manager.close()
+    return file_path
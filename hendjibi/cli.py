@@ -0,0 +1,269 @@
+"""Headless command line access to the library.
+
+Only ``hendjibi.model`` and ``hendjibi.tools`` are imported and no widget is ever
+built; Qt is loaded only by ``duplicates`` and ``reprocess-covers``, which decode
+covers with ``QImage``.
+Changes go through ``DataManager`` like edits made in the GUI, so with the
+journaled storage each edit costs one journal append.
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+
+from hendjibi import PROJECT_NAME_SHORT
+from hendjibi.model.covers import describe_savings, format_size, reprocess_covers
+from hendjibi.model.dac import DataManager
+from hendjibi.model.entry import EntryType, ProgressStatus, EntryStatus
+from hendjibi.model.exchange import entry_to_record
+from hendjibi.model.filters import Attr, Everything, Or, Range
+from hendjibi.model.sorting import SortOrder, init_collation
+from hendjibi.tools.app_logger import init_logger
+from hendjibi.tools.config import ConfigManager
+from hendjibi.tools.tracing import init_tracing
+from hendjibi.tools.translator import translate as _
+
+MIN_UID_PREFIX = 4
+OUTPUT_FORMATS = ('text', 'jsonl')
+
+
+class CliError(Exception):
+    pass
+
+
+def _enum_value(enum_type):
+    # accepts the value ('LightNovel') or the member name ('light_novel') in any case
+    lookup = {}
+    for member in enum_type:
+        lookup[member.value.lower()] = member
+        lookup[member.name.lower()] = member
+
+    def parse(text):
+        try:
+            return lookup[text.lower()]
+        except KeyError:
+            choices = ', '.join(member.value for member in enum_type)
+            raise argparse.ArgumentTypeError(_(F'invalid {enum_type.__name__} {text!r}, choose from {choices}'))
+    parse.__name__ = enum_type.__name__
+    return parse
+
+
+def add_filter_arguments(parser):
+    parser.add_argument('-t', '--type', dest='entry_types', action='append', type=_enum_value(EntryType),
+                        help=_('entry type, may be repeated'))
+    parser.add_argument('-p', '--progress-status', dest='progress_statuses', action='append',
+                        type=_enum_value(ProgressStatus), help=_('progress status, may be repeated'))
+    parser.add_argument('-e', '--entry-status', dest='entry_statuses', action='append',
+                        type=_enum_value(EntryStatus), help=_('entry status, may be repeated'))
+    nsfw = parser.add_mutually_exclusive_group()
+    nsfw.add_argument('--nsfw', dest='nsfw', action='store_true', default=None, help=_('only NSFW entries'))
+    nsfw.add_argument('--sfw', dest='nsfw', action='store_false', help=_('hide NSFW entries'))
+    parser.add_argument('--min-progress', type=int, help=_('lowest progress to include'))
+    parser.add_argument('--max-progress', type=int, help=_('highest progress to include'))
+    parser.add_argument('-s', '--search', help=_('only entries matching this text'))
+
+
+def build_query(args):
+    query = Everything()
+    for name, values in (('entry_type', args.entry_types), ('progress_status', args.progress_statuses),
+                         ('entry_status', args.entry_statuses)):
+        if values:
+            query &= Or(*(Attr(name, value) for value in values))
+    if args.nsfw is not None:
+        query &= Attr('nsfw', args.nsfw)
+    if args.min_progress is not None or args.max_progress is not None:
+        query &= Range('progress', args.min_progress, args.max_progress)
+    return query
+
+
+def select_entries(data_manager, args):
+    entries = data_manager.query(build_query(args))
+    if args.search:
+        matches = {entry.uid for entry in data_manager.search(args.search, len(data_manager.all_entries))}
+        entries = [entry for entry in entries if entry.uid in matches]
+    return entries
+
+
+def find_entry(data_manager, reference):
+    """Resolves a uid prefix or a title to exactly one entry."""
+    if len(reference) >= MIN_UID_PREFIX:
+        by_uid = [entry for entry in data_manager.iterate_entries() if entry.uid.startswith(reference)]
+        if len(by_uid) == 1:
+            return by_uid[0]
+    wanted = reference.casefold()
+    by_title = [entry for entry in data_manager.iterate_entries()
+                if wanted in (entry.title_english.casefold(), entry.title_original.casefold())]
+    if len(by_title) == 1:
+        return by_title[0]
+    candidates = by_title or data_manager.search(reference, 5)
+    if not candidates:
+        raise CliError(_(F'No entry matches {reference!r}'))
+    listing = '\n'.join(format_entry(entry) for entry in candidates)
+    raise CliError(_(F'{reference!r} is ambiguous, use a uid prefix:\n{listing}'))
+
+
+def format_entry(entry):
+    return (F'{entry.uid[:8]}  {entry.entry_type.value:<11} {entry.progress_status.value:<9} '
+            F'{entry.entry_status.value:<9} {entry.progress:>5}/{entry.max_progress:<5} {entry}')
+
+
+def print_entries(entries, output_format, out):
+    for entry in entries:
+        if output_format == 'jsonl':
+            out.write(json.dumps(entry_to_record(entry), ensure_ascii=False))
+        else:
+            out.write(format_entry(entry))
+        out.write('\n')
+
+
+def command_list(data_manager, args, out):
+    entries = select_entries(data_manager, args)
+    if args.order:
+        selected = {entry.uid for entry in entries}
+        entries = [entry for entry in data_manager.sort_index(args.order) if entry.uid in selected]
+    if args.limit:
+        entries = entries[:args.limit]
+    print_entries(entries, args.format, out)
+
+
+def command_search(data_manager, args, out):
+    print_entries(data_manager.search(args.query, args.limit), args.format, out)
+
+
+def command_progress(data_manager, args, out):
+    entry = find_entry(data_manager, args.entry)
+    if args.set is not None:
+        data_manager.set_progress(entry, args.set)
+    else:
+        for _step in range(args.add):
+            data_manager.add_one_progress(entry)
+    out.write(format_entry(entry) + '\n')
+
+
+def command_set_status(data_manager, args, out):
+    if args.new_progress_status is None and args.new_entry_status is None:
+        raise CliError(_('Nothing to set, give --to-progress-status and/or --to-entry-status'))
+    entries = select_entries(data_manager, args)
+    for entry in entries:
+        if args.new_entry_status is not None:
+            data_manager.set_status(entry, args.new_entry_status)
+        if args.new_progress_status is not None:
+            data_manager.set_fields(entry, progress_status=args.new_progress_status)
+    out.write(_(F'Updated {len(entries)} entries\n'))
+
+
+def command_stats(data_manager, args, out):
+    entries = select_entries(data_manager, args)
+    out.write(_(F'Entries: {len(entries)}\n'))
+    out.write(_(F'Progress: {sum(entry.progress for entry in entries)}\n'))
+    for title, counter in ((_('Entry type'), Counter(entry.entry_type.value for entry in entries)),
+                           (_('Progress status'), Counter(entry.progress_status.value for entry in entries)),
+                           (_('Entry status'), Counter(entry.entry_status.value for entry in entries))):
+        out.write(F'{title}:\n')
+        for name, count in counter.most_common():
+            out.write(F'  {name:<12} {count:>7}\n')
+
+
+def command_duplicates(data_manager, args, out):
+    if args.entry:
+        entry = find_entry(data_manager, args.entry)
+        for other, reason, distance in data_manager.find_duplicates(entry):
+            out.write(F'{format_entry(other)}  [{reason} {distance}]\n')
+        return
+    groups = data_manager.duplicate_groups()
+    for group in groups:
+        for entry in group:
+            out.write(format_entry(entry) + '\n')
+        out.write('\n')
+    out.write(_(F'{len(groups)} groups of possible duplicates\n'))
+
+
+def command_reprocess_covers(data_manager, args, out):
+    def progress(done, total):
+        if args.verbose and (done == total or done % 100 == 0):
+            out.write(_(F'{done}/{total} covers\n'))
+    report = reprocess_covers(data_manager, args.max_dimension, args.max_kb * 1024, args.workers, progress)
+    out.write(_(F'Covers: {report.covers}, re-encoded: {report.reencoded}, failed: {report.failed}\n'))
+    out.write(_(F'Cover data: {describe_savings(report.size_before, report.size_after)}\n'))
+    out.write(_(F'Cover store: {format_size(report.reclaimed)} freed\n'))
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(prog=PROJECT_NAME_SHORT, description=_('Work on the library without the GUI'))
+    parser.add_argument('--data', help=_('data file, defaults to data_dump_path from the config'))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = commands.add_parser('list', help=_('list entries matching the filters'))
+    add_filter_arguments(list_parser)
+    list_parser.add_argument('-n', '--limit', type=int, default=0, help=_('show at most this many entries'))
+    list_parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='text')
+    list_parser.add_argument('-o', '--order', choices=[order.value for order in SortOrder],
+                             help=_('sort order, insertion order by default'))
+    list_parser.set_defaults(handler=command_list)
+
+    search_parser = commands.add_parser('search', help=_('typo tolerant search over titles and descriptions'))
+    search_parser.add_argument('query')
+    search_parser.add_argument('-n', '--limit', type=int, default=20)
+    search_parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='text')
+    search_parser.set_defaults(handler=command_search)
+
+    progress_parser = commands.add_parser('progress', help=_('bump or set the progress of one entry'))
+    progress_parser.add_argument('entry', help=_('uid prefix or exact title'))
+    progress_amount = progress_parser.add_mutually_exclusive_group()
+    progress_amount.add_argument('--add', type=int, default=1, help=_('steps to add, 1 by default'))
+    progress_amount.add_argument('--set', type=int, help=_('new progress value'))
+    progress_parser.set_defaults(handler=command_progress)
+
+    status_parser = commands.add_parser('set-status', help=_('change the status of every matching entry'))
+    add_filter_arguments(status_parser)
+    status_parser.add_argument('--to-progress-status', dest='new_progress_status', type=_enum_value(ProgressStatus))
+    status_parser.add_argument('--to-entry-status', dest='new_entry_status', type=_enum_value(EntryStatus))
+    status_parser.set_defaults(handler=command_set_status)
+
+    duplicates_parser = commands.add_parser('duplicates', help=_('find entries with the same title or a similar cover'))
+    duplicates_parser.add_argument('entry', nargs='?', help=_('only look for duplicates of this entry'))
+    duplicates_parser.set_defaults(handler=command_duplicates)
+
+    covers_parser = commands.add_parser('reprocess-covers',
+                                        help=_('downscale and re-encode stored covers larger than the caps'))
+    covers_parser.add_argument('--max-dimension', type=int, help=_('longest cover side in pixels, from the config '
+                                                                   'by default'))
+    covers_parser.add_argument('--max-kb', type=int, help=_('largest cover size in KB, from the config by default'))
+    covers_parser.add_argument('-j', '--workers', type=int, help=_('worker processes, one per CPU by default'))
+    covers_parser.add_argument('-v', '--verbose', action='store_true', help=_('report progress'))
+    covers_parser.set_defaults(handler=command_reprocess_covers)
+
+    stats_parser = commands.add_parser('stats', help=_('count entries per type and status'))
+    add_filter_arguments(stats_parser)
+    stats_parser.set_defaults(handler=command_stats)
+    return parser
+
+
+def main(argv=None, out=sys.stdout):
+    args = create_parser().parse_args(argv)
+    start_cwd = os.getcwd()
+    init_logger(start_cwd)
+    config = ConfigManager(start_cwd)
+    init_tracing(os.path.dirname(config.config_path), config.tracing)
+    init_collation()
+    # cover caps not given on the command line come from the config
+    for name, value in (('max_dimension', config.cover_max_dimension), ('max_kb', config.cover_max_kb)):
+        if getattr(args, name, False) is None:
+            setattr(args, name, value)
+    data_manager = DataManager(args.data or config.data_dump_path, config.journaled_storage,
+                               config.journal_compact_threshold, True, config.storage_backend)
+    try:
+        args.handler(data_manager, args, out)
+    except CliError as e:
+        sys.stderr.write(F'{e}\n')
+        return 1
+    finally:
+        data_manager.close()
+        # a config write still waiting on its timer would be lost with the process
+        config.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,23 @@
 import os
+import sys
 
-from hendjibi.pyqt.gui import start_gui
 from hendjibi.tools.config import ConfigManager
 from hendjibi.tools.app_logger import init_logger
+from hendjibi.model.sorting import init_collation
+from hendjibi.tools.tracing import init_tracing
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        # any argument selects the headless CLI, which never imports Qt
+        from hendjibi.cli import main
+        sys.exit(main(sys.argv[1:]))
     start_cwd = os.getcwd()
     logger = init_logger(start_cwd)
     try:
         config = ConfigManager(start_cwd)
+        init_tracing(os.path.dirname(config.config_path), config.tracing)
+        init_collation()
+        from hendjibi.pyqt.gui import start_gui
         start_gui(config)
     except Exception as e:
         logger.critical(F'Application failed due to : {e}')
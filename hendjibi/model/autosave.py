@@ -0,0 +1,62 @@
+import threading
+import time
+
+from hendjibi.tools.app_logger import get_logger
+from hendjibi.tools.translator import translate as _
+
+logger = get_logger(__name__)
+
+AUTOSAVE_INTERVAL = 60
+
+
+class AutosaveService(object):
+    """Periodically saves the entries of a ``DataManager`` from a daemon thread.
+
+    Only the snapshot capture holds the data manager lock, serializing and
+    writing happen on this thread, so the GUI keeps running while it saves.
+    While it runs, a journal that reached its compaction threshold is
+    compacted here instead of on the thread that made the last edit.
+    """
+
+    def __init__(self, data_manager, interval=AUTOSAVE_INTERVAL):
+        self.data_manager = data_manager
+        self.interval = interval
+        self.save_count = 0
+        self._last_save = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self.data_manager.background_compaction = True
+        self._thread = threading.Thread(target=self._run, name='autosave', daemon=True)
+        self._thread.start()
+        logger.info(_(F'Autosave every {self.interval}s'))
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.data_manager.background_compaction = False
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.save_now()
+
+    def save_now(self):
+        start = time.perf_counter()
+        try:
+            written = self.data_manager.autosave()
+        except Exception as e:
+            logger.error(_(F'Autosave failed due to: {e}'))
+            return
+        if written is None:
+            return
+        now = time.monotonic()
+        since_last = F', {now - self._last_save:.0f}s after the previous one' if self._last_save is not None else ''
+        self._last_save = now
+        self.save_count += 1
+        logger.info(_(F'Autosave #{self.save_count} wrote {written} of {len(self.data_manager.all_entries)} entries '
+                      F'in {time.perf_counter() - start:.3f}s{since_last}'))
@@ -0,0 +1,422 @@
+import glob
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import datetime
+from enum import Enum
+
+from hendjibi.model.entry import GenericEntry, LEGACY_DATE_ADDED
+from hendjibi.model.journal import Journal, JournalOp
+from hendjibi.tools.app_logger import get_logger
+from hendjibi.tools.tracing import traced
+from hendjibi.tools.translator import translate as _
+
+logger = get_logger(__name__)
+
+COMPACT_THRESHOLD = 500
+SQLITE_BATCH_SIZE = 50
+
+
+class BackendType(Enum):
+    PICKLE = 'pickle'
+    SQLITE = 'sqlite'
+
+
+class ChangeSet(object):
+    """Entries added and fields changed since the last save.
+
+    ``added`` maps uids to new entries, ``changed`` maps uids to
+    ``(entry, state names)`` for stored entries that were modified.
+    """
+    __slots__ = ('added', 'changed')
+
+    def __init__(self):
+        self.added = {}
+        self.changed = {}
+
+    def __len__(self):
+        return len(self.added) + len(self.changed)
+
+    def __bool__(self):
+        return bool(self.added or self.changed)
+
+    def __contains__(self, uid):
+        return uid in self.added or uid in self.changed
+
+    def add(self, entry):
+        self.added[entry.uid] = entry
+
+    def change(self, entry, names):
+        if entry.uid in self.added:
+            # the entry is written whole anyway
+            return
+        if entry.uid in self.changed:
+            self.changed[entry.uid][1].update(names)
+        else:
+            self.changed[entry.uid] = (entry, set(names))
+
+    def merge(self, older):
+        """Folds back ``older``, a change set taken before this one whose save failed."""
+        for uid, entry in older.added.items():
+            self.changed.pop(uid, None)
+            self.added[uid] = entry
+        for entry, names in older.changed.values():
+            self.change(entry, names)
+
+    def changed_states(self):
+        """Yields ``(entry, {state name: current value})`` for every changed entry."""
+        for entry, names in self.changed.values():
+            state = entry.__getstate__()
+            yield entry, {name: state[name] for name in names if name in state}
+
+
+class StorageBackend(ABC):
+    """Persistence used by ``DataManager``.
+
+    ``load`` returns every stored entry, ``add`` and ``update`` persist single
+    mutations (``changes`` maps ``GenericEntry`` state names to new values) and
+    ``save`` writes the complete entry list. ``save_changes`` makes the
+    mutations of a ``ChangeSet`` durable without rewriting untouched entries.
+
+    Background saves go through ``capture`` (a cheap copy taken while entries
+    can not change), ``write_snapshot`` (the slow part, safe to run on another
+    thread, returns what it wrote) and ``commit_snapshot``, which takes that
+    result and returns True when mutations recorded after the capture have been
+    dropped and must be persisted again. A written snapshot that is not
+    committed is passed to ``discard_snapshot``.
+    """
+    needs_compaction = False
+    # whether add and update are durable on their own, without a later save
+    persists_mutations = True
+
+    @abstractmethod
+    def load(self):
+        pass
+
+    @abstractmethod
+    def add(self, entry):
+        pass
+
+    def add_many(self, entries):
+        for entry in entries:
+            self.add(entry)
+
+    @abstractmethod
+    def update(self, entry, changes):
+        pass
+
+    @abstractmethod
+    def save(self, entries):
+        pass
+
+    def save_changes(self, change_set):
+        self.flush()
+
+    def flush(self):
+        pass
+
+    def capture(self, entries):
+        return None
+
+    def write_snapshot(self, snapshot):
+        return None
+
+    def commit_snapshot(self, written):
+        self.flush()
+        return False
+
+    def discard_snapshot(self, written):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class PickleBackend(StorageBackend):
+    """Single pickle snapshot, optionally with an append-only journal of mutations."""
+
+    def __init__(self, file_path, journaled=True, compact_threshold=COMPACT_THRESHOLD):
+        self.file_path = file_path
+        self.journal = Journal(F'{self.file_path}.journal') if journaled else None
+        self.compact_threshold = compact_threshold
+        self._needs_snapshot = False
+        # journal left by an earlier journaled run, removed once its records are in the snapshot
+        self._stale_journal = None
+
+    @property
+    def persists_mutations(self):
+        return self.journal is not None
+
+    @property
+    def needs_compaction(self):
+        if self._needs_snapshot:
+            return True
+        return self.journal is not None and self.journal.record_count >= self.compact_threshold
+
+    @traced()
+    def load(self):
+        entries = list()
+        for tmp_path in glob.glob(F'{glob.escape(self.file_path)}.snapshot-*.tmp'):
+            # left behind by a write that was interrupted before its rename
+            os.remove(tmp_path)
+        if os.path.isfile(self.file_path):
+            try:
+                with open(self.file_path, 'rb') as the_file:
+                    data = the_file.read()
+                entries = self.loads(data)
+            except EOFError as e:
+                logger.error(_(F'Failed to load entries data, runtime error is: {e}'))
+                logger.info(_('Created empty database, previous file renamed for safety'))
+                os.rename(self.file_path, F'{self.file_path}_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}')
+                with open(self.file_path, 'wb') as f:
+                    f.write(self.dump(entries))
+            except Exception as e:
+                logger.error(_(F'Failed to load entries data, runtime error is: {e}'))
+        else:
+            # no data
+            with open(self.file_path, 'wb') as f:
+                f.write(self.dump(entries))
+        journal = self.journal
+        if journal is None and os.path.isfile(F'{self.file_path}.journal'):
+            # journaling was turned off, the records written before still belong to the library
+            journal = self._stale_journal = Journal(F'{self.file_path}.journal')
+        if journal is not None:
+            journal_existed = os.path.isfile(journal.file_path)
+            self.replay_journal(entries, journal)
+            # replayed records are folded into a new snapshot right away; a snapshot written without
+            # a journal may hold entries with freshly assigned uids, it has to be rewritten before any
+            # journal record refers to them
+            self._needs_snapshot = journal.record_count > 0 or (journal is self.journal and not journal_existed)
+        return entries
+
+    @traced()
+    def replay_journal(self, entries, journal):
+        entries_by_uid = {e.uid: e for e in entries}
+        for op, uid, payload in journal.replay():
+            if op is JournalOp.ADD:
+                entry = GenericEntry.from_state(payload)
+                entries_by_uid[uid] = entry
+                entries.append(entry)
+            elif op is JournalOp.UPDATE:
+                if uid in entries_by_uid:
+                    entries_by_uid[uid].apply_changes(payload)
+                else:
+                    logger.warning(_(F'Journal refers to unknown entry {uid}, record skipped'))
+        if journal.record_count > 0:
+            logger.info(_(F'Replayed {journal.record_count} journal records'))
+
+    def add(self, entry):
+        if self.journal is not None:
+            self.journal.append(JournalOp.ADD, entry.uid, entry.__getstate__())
+
+    def update(self, entry, changes):
+        if self.journal is not None:
+            self.journal.append(JournalOp.UPDATE, entry.uid, changes)
+
+    def save_changes(self, change_set):
+        # every mutation was appended to the journal when it was made, only its durability is pending
+        if self.journal is not None:
+            self.journal.sync()
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    @traced()
+    def save(self, entries):
+        self._replace(self._write(self.dump(entries)))
+
+    def _write(self, dump_data):
+        # every write gets its own temporary file, a compaction can run while the autosave thread writes
+        fd, tmp_path = tempfile.mkstemp(prefix=F'{os.path.basename(self.file_path)}.snapshot-', suffix='.tmp',
+                                        dir=os.path.dirname(os.path.abspath(self.file_path)))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(dump_data)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.isfile(self.file_path):
+                shutil.copymode(self.file_path, tmp_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def _replace(self, tmp_path):
+        # the previous snapshot stays reachable as .bak, the new one takes its place atomically
+        if os.path.isfile(self.file_path):
+            try:
+                if os.path.isfile(F'{self.file_path}.bak'):
+                    os.remove(F'{self.file_path}.bak')
+                os.link(self.file_path, F'{self.file_path}.bak')
+            except OSError:
+                pass
+        os.replace(tmp_path, self.file_path)
+        if self.journal is not None:
+            self.journal.truncate()
+        if self._stale_journal is not None:
+            os.remove(self._stale_journal.file_path)
+            self._stale_journal = None
+        self._needs_snapshot = False
+
+    def capture(self, entries):
+        return [entry.snapshot() for entry in entries]
+
+    @traced()
+    def write_snapshot(self, snapshot):
+        return self._write(pickle.dumps(snapshot))
+
+    def commit_snapshot(self, written):
+        self._replace(written)
+        return self.journal is not None
+
+    def discard_snapshot(self, written):
+        if os.path.isfile(written):
+            os.remove(written)
+
+    @staticmethod
+    def dump(entries):
+        return pickle.dumps(entries)
+
+    @staticmethod
+    def loads(dump_object):
+        return pickle.loads(dump_object)
+
+
+# GenericEntry state name -> column, enums and dates are stored in their compact form
+SQLITE_COLUMNS = (
+    ('uid', 'uid TEXT PRIMARY KEY'),
+    ('title_english', 'title_english TEXT'),
+    ('title_original', 'title_original TEXT'),
+    ('synonyms', 'synonyms TEXT'),
+    ('_release_date1', 'release_date1 INTEGER'),
+    ('_release_date2', 'release_date2 INTEGER'),
+    ('_entry_status', 'entry_status INTEGER'),
+    ('description', 'description TEXT'),
+    ('nsfw', 'nsfw INTEGER'),
+    ('_entry_type', 'entry_type INTEGER'),
+    ('progress', 'progress INTEGER'),
+    ('max_progress', 'max_progress INTEGER'),
+    ('_progress_status', 'progress_status INTEGER'),
+    ('cover_hash', 'cover_hash TEXT'),
+    ('_date_added', F'date_added INTEGER NOT NULL DEFAULT {LEGACY_DATE_ADDED}'),
+)
+SQLITE_INDEXED_COLUMNS = ('entry_type', 'progress_status', 'entry_status', 'release_date1', 'release_date2')
+
+
+def _column_name(definition):
+    return definition.split(' ', 1)[0]
+
+
+class SqliteBackend(StorageBackend):
+    """SQLite database in WAL mode with indexed type, status and release date columns.
+
+    Mutations are queued and written in one transaction per ``batch_size``
+    statements or on ``flush``. An empty database is seeded once from the pickle
+    at ``legacy_path``, which is renamed after the first successful save.
+    """
+
+    def __init__(self, db_path, legacy_path=None, batch_size=SQLITE_BATCH_SIZE):
+        self.db_path = db_path
+        self.legacy_path = legacy_path
+        self.batch_size = batch_size
+        self._pending = []
+        self._migrating = False
+        # autosave flushes from its own thread, DataManager serializes access to the connection
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        columns = ', '.join(definition for state_name, definition in SQLITE_COLUMNS)
+        self.connection.execute(F'CREATE TABLE IF NOT EXISTS entries ({columns})')
+        existing = {row[1] for row in self.connection.execute('PRAGMA table_info(entries)')}
+        for state_name, definition in SQLITE_COLUMNS:
+            if _column_name(definition) not in existing:
+                # databases created by an older version miss the columns added since
+                self.connection.execute(F'ALTER TABLE entries ADD COLUMN {definition}')
+        for column in SQLITE_INDEXED_COLUMNS:
+            self.connection.execute(F'CREATE INDEX IF NOT EXISTS idx_entries_{column} ON entries ({column})')
+        self.connection.commit()
+        self._columns = {state_name: _column_name(definition) for state_name, definition in SQLITE_COLUMNS}
+        column_names = ', '.join(self._columns.values())
+        placeholders = ', '.join('?' * len(SQLITE_COLUMNS))
+        self._insert_sql = F'INSERT OR REPLACE INTO entries ({column_names}) VALUES ({placeholders})'
+        self._select_sql = F'SELECT {column_names} FROM entries'
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    @staticmethod
+    def _row(entry):
+        state = entry.__getstate__()
+        return tuple(state[state_name] for state_name, definition in SQLITE_COLUMNS)
+
+    def _entry(self, row):
+        return GenericEntry.from_state(dict(zip(self._columns, row)))
+
+    @property
+    def needs_compaction(self):
+        return self._migrating
+
+    @traced()
+    def load(self):
+        if self.legacy_path is not None and os.path.isfile(self.legacy_path) and len(self) == 0:
+            self._migrating = True
+            return PickleBackend(self.legacy_path).load()
+        return self.select()
+
+    @traced()
+    def select(self, where='', params=()):
+        self.flush()
+        sql = F'{self._select_sql} WHERE {where}' if where else self._select_sql
+        return [self._entry(row) for row in self.connection.execute(sql, params)]
+
+    def _queue(self, sql, params):
+        self._pending.append((sql, params))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def add(self, entry):
+        self._queue(self._insert_sql, self._row(entry))
+
+    @traced()
+    def add_many(self, entries):
+        self.flush()
+        with self.connection:
+            self.connection.executemany(self._insert_sql, (self._row(entry) for entry in entries))
+
+    def update(self, entry, changes):
+        columns = [(self._columns[name], value) for name, value in changes.items() if name in self._columns]
+        if not columns:
+            return
+        assignments = ', '.join(F'{column} = ?' for column, value in columns)
+        params = tuple(value for column, value in columns) + (entry.uid,)
+        self._queue(F'UPDATE entries SET {assignments} WHERE uid = ?', params)
+
+    @traced()
+    def flush(self):
+        if not self._pending:
+            return
+        with self.connection:
+            for sql, params in self._pending:
+                self.connection.execute(sql, params)
+        self._pending = []
+
+    @traced()
+    def save(self, entries):
+        self._pending = []
+        with self.connection:
+            self.connection.execute('DELETE FROM entries')
+            self.connection.executemany(self._insert_sql, (self._row(entry) for entry in entries))
+        if self._migrating:
+            self._migrating = False
+            for suffix in ('', '.journal'):
+                if os.path.isfile(F'{self.legacy_path}{suffix}'):
+                    os.replace(F'{self.legacy_path}{suffix}', F'{self.legacy_path}{suffix}.migrated')
+            logger.info(_(F'Migrated {len(entries)} entries from {self.legacy_path} to {self.db_path}'))
+
+    def close(self):
+        self.flush()
+        self.connection.close()
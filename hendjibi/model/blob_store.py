@@ -0,0 +1,126 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+
+from hendjibi.tools.app_logger import get_logger
+from hendjibi.tools.translator import translate as _
+
+logger = get_logger(__name__)
+
+BLOB_HEADER = struct.Struct('<32sQ')
+
+
+def hash_blob(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore(object):
+    """Content-addressed, append-only store for cover images.
+
+    Blobs are written one after another as ``sha256 digest | size | bytes``,
+    identical content is stored once and reads are served from a read-only
+    memory map of the file. Worker processes open the store with
+    ``read_only``, they never write to it nor repair a torn tail, which may
+    just be a blob the owning process is writing.
+    """
+
+    def __init__(self, file_path, read_only=False):
+        self.file_path = file_path
+        self.read_only = read_only
+        self._index = {}  # type: dict
+        self._handle = None
+        self._mmap = None
+        # the GUI thread reads covers while background threads hash or add them, remapping swaps _mmap
+        self._lock = threading.RLock()
+        if os.path.isfile(self.file_path):
+            self._scan()
+
+    def _scan(self):
+        offset = 0
+        file_size = os.path.getsize(self.file_path)
+        with open(self.file_path, 'rb') as the_file:
+            while offset + BLOB_HEADER.size <= file_size:
+                the_file.seek(offset)
+                digest, size = BLOB_HEADER.unpack(the_file.read(BLOB_HEADER.size))
+                data_offset = offset + BLOB_HEADER.size
+                if data_offset + size > file_size:
+                    break
+                self._index[digest.hex()] = (data_offset, size)
+                offset = data_offset + size
+        if offset != file_size and not self.read_only:
+            logger.warning(_(F'Cover store {self.file_path} ends with a torn blob, truncating it'))
+            with open(self.file_path, 'r+b') as the_file:
+                the_file.truncate(offset)
+
+    def __contains__(self, blob_hash):
+        return blob_hash in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def put(self, data, blob_hash=None):
+        # blob_hash may be given when the data was already hashed elsewhere
+        if not data:
+            return ''
+        blob_hash = blob_hash or hash_blob(data)
+        with self._lock:
+            if blob_hash in self._index:
+                return blob_hash
+            if self.read_only:
+                raise ValueError(_(F'Cover store {self.file_path} is opened read-only'))
+            if self._handle is None:
+                self._handle = open(self.file_path, 'ab')
+            offset = self._handle.seek(0, os.SEEK_END)
+            self._handle.write(BLOB_HEADER.pack(bytes.fromhex(blob_hash), len(data)))
+            self._handle.write(data)
+            self._handle.flush()
+            self._index[blob_hash] = (offset + BLOB_HEADER.size, len(data))
+            return blob_hash
+
+    def get(self, blob_hash):
+        with self._lock:
+            if blob_hash not in self._index:
+                return b''
+            offset, size = self._index[blob_hash]
+            if self._mmap is None or offset + size > len(self._mmap):
+                self._remap()
+            return self._mmap[offset:offset + size]
+
+    def rewrite(self, live_hashes):
+        """Copies the blobs in ``live_hashes`` to a new file that replaces the store, returns the bytes freed."""
+        with self._lock:
+            live = [blob_hash for blob_hash in self._index if blob_hash in live_hashes]
+            size_before = os.path.getsize(self.file_path) if os.path.isfile(self.file_path) else 0
+            tmp_path = F'{self.file_path}.tmp'
+            index = {}
+            with open(tmp_path, 'wb') as the_file:
+                for blob_hash in live:
+                    data = self.get(blob_hash)
+                    offset = the_file.tell()
+                    the_file.write(BLOB_HEADER.pack(bytes.fromhex(blob_hash), len(data)))
+                    the_file.write(data)
+                    index[blob_hash] = (offset + BLOB_HEADER.size, len(data))
+                the_file.flush()
+                os.fsync(the_file.fileno())
+            self.close()
+            os.replace(tmp_path, self.file_path)
+            self._index = index
+            return size_before - os.path.getsize(self.file_path)
+
+    def _remap(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+            with open(self.file_path, 'rb') as the_file:
+                self._mmap = mmap.mmap(the_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
@@ -0,0 +1,195 @@
+"""Cover ingestion: validation, downscaling and re-encoding of cover images.
+
+Covers within the size caps are kept byte for byte, their header is enough to
+tell, so only oversized or unusual images are decoded and re-encoded. Like
+``duplicates`` this module imports Qt only once a cover is processed, and the
+processing is meant to run in worker processes.
+"""
+import multiprocessing
+from collections import namedtuple, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from hendjibi.model.blob_store import BlobStore
+from hendjibi.tools.app_logger import get_logger
+from hendjibi.tools.translator import translate as _
+
+logger = get_logger(__name__)
+
+COVER_MAX_DIMENSION = 1000
+COVER_MAX_BYTES = 400 * 1024
+# formats stored as they are when they fit the caps, anything else is re-encoded
+KEPT_FORMATS = ('jpeg', 'png', 'webp')
+JPEG_QUALITIES = (90, 85, 80, 70, 60, 50)
+REPROCESS_CHUNK_SIZE = 8
+
+
+class InvalidCoverError(ValueError):
+    pass
+
+
+class CoverResult(namedtuple('CoverResult', 'data original_size width height reencoded')):
+    __slots__ = ()
+
+    @property
+    def saved(self):
+        return self.original_size - len(self.data)
+
+
+ReprocessReport = namedtuple('ReprocessReport', 'covers reencoded failed size_before size_after reclaimed')
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return F'{size:.0f} {unit}' if unit == 'B' else F'{size:.1f} {unit}'
+        size /= 1024
+    return F'{size:.1f} GB'
+
+
+def describe_savings(size_before, size_after):
+    if size_before <= 0:
+        return format_size(size_after)
+    return (F'{format_size(size_before)} -> {format_size(size_after)} '
+            F'({(size_before - size_after) / size_before:.0%} smaller)')
+
+
+def _encode(image, image_format, quality=-1):
+    from PyQt5.QtCore import QBuffer, QByteArray, QIODevice
+    byte_array = QByteArray()
+    buffer = QBuffer(byte_array)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, image_format, quality)
+    return bytes(byte_array)
+
+
+def _encode_within(image, max_bytes):
+    # transparent covers stay PNG when that fits, everything else becomes the largest JPEG that fits
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtGui import QImage, QPainter
+    if image.hasAlphaChannel():
+        data = _encode(image, 'PNG')
+        if len(data) <= max_bytes:
+            return data
+        opaque = QImage(image.size(), QImage.Format_RGB32)
+        opaque.fill(Qt.white)
+        painter = QPainter(opaque)
+        painter.drawImage(0, 0, image)
+        painter.end()
+        image = opaque
+    for quality in JPEG_QUALITIES:
+        data = _encode(image, 'JPG', quality)
+        if len(data) <= max_bytes:
+            break
+    return data
+
+
+def process_cover(data, max_dimension=COVER_MAX_DIMENSION, max_bytes=COVER_MAX_BYTES):
+    """Returns a ``CoverResult`` holding ``data`` as it should be stored.
+
+    Covers larger than ``max_dimension`` on their longest side are scaled down,
+    covers over ``max_bytes`` or in another format are re-encoded. Raises
+    ``InvalidCoverError`` when ``data`` is not a readable image.
+    """
+    from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, Qt
+    from PyQt5.QtGui import QImageReader
+    buffer = QBuffer()
+    buffer.setData(QByteArray(bytes(data)))
+    buffer.open(QIODevice.ReadOnly)
+    reader = QImageReader(buffer)
+    if not data or not reader.canRead():
+        raise InvalidCoverError(_('Not a supported image'))
+    image_format = bytes(reader.format()).decode().lower()
+    size = reader.size()
+    fits = size.isValid() and max(size.width(), size.height()) <= max_dimension
+    if fits and image_format in KEPT_FORMATS and len(data) <= max_bytes:
+        return CoverResult(bytes(data), len(data), size.width(), size.height(), False)
+    image = reader.read()
+    if image.isNull():
+        raise InvalidCoverError(reader.errorString())
+    if max(image.width(), image.height()) > max_dimension:
+        image = image.scaled(max_dimension, max_dimension, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    encoded = _encode_within(image, max_bytes)
+    if fits and image_format in KEPT_FORMATS and len(encoded) >= len(data):
+        # re-encoding did not help, the original is kept
+        return CoverResult(bytes(data), len(data), image.width(), image.height(), False)
+    return CoverResult(encoded, len(data), image.width(), image.height(), True)
+
+
+def process_cover_file(file_path, max_dimension=COVER_MAX_DIMENSION, max_bytes=COVER_MAX_BYTES):
+    with open(file_path, 'rb') as the_file:
+        data = the_file.read()
+    return process_cover(data, max_dimension, max_bytes)
+
+
+def qt_worker_context():
+    # a process forked after Qt was used can inherit one of its locks held and hang on first use,
+    # workers that decode images are spawned instead
+    return multiprocessing.get_context('spawn')
+
+
+_ingestion_pool = None
+
+
+def ingestion_pool():
+    """Single worker process for covers picked in the GUI, started on first use."""
+    global _ingestion_pool
+    if _ingestion_pool is None:
+        _ingestion_pool = ProcessPoolExecutor(1, mp_context=qt_worker_context())
+    return _ingestion_pool
+
+
+_worker_store = None
+
+
+def _init_worker(store_path):
+    global _worker_store
+    _worker_store = BlobStore(store_path, read_only=True)
+
+
+def _reprocess_stored_cover(cover_hash, max_dimension, max_bytes):
+    # runs in a worker process, covers are read from the worker's own view of the store
+    data = _worker_store.get(cover_hash)
+    try:
+        result = process_cover(data, max_dimension, max_bytes)
+    except InvalidCoverError as e:
+        return cover_hash, len(data), None, str(e)
+    return cover_hash, len(data), result if result.reencoded else None, ''
+
+
+def reprocess_covers(data_manager, max_dimension=COVER_MAX_DIMENSION, max_bytes=COVER_MAX_BYTES, workers=None,
+                     on_progress=None):
+    """Runs every stored cover through ``process_cover`` across worker processes.
+
+    Entries are pointed at their re-encoded covers and the cover store is
+    rewritten without the blobs no entry uses anymore. ``on_progress`` receives
+    ``(done, total)`` after every cover. Returns a ``ReprocessReport``.
+    """
+    entries_by_cover = defaultdict(list)
+    for entry in data_manager.iterate_entries():
+        if entry.cover_hash:
+            entries_by_cover[entry.cover_hash].append(entry)
+    reencoded = failed = size_before = size_after = 0
+    work = partial(_reprocess_stored_cover, max_dimension=max_dimension, max_bytes=max_bytes)
+    with ProcessPoolExecutor(workers, mp_context=qt_worker_context(), initializer=_init_worker,
+                             initargs=(data_manager.covers.file_path,)) as pool:
+        results = pool.map(work, list(entries_by_cover), chunksize=REPROCESS_CHUNK_SIZE)
+        for done, (cover_hash, original_size, result, error) in enumerate(results, 1):
+            size_before += original_size
+            if error:
+                failed += 1
+                size_after += original_size
+                logger.warning(_(F'Cover {cover_hash} could not be processed: {error}'))
+            elif result is None:
+                size_after += original_size
+            else:
+                reencoded += 1
+                size_after += len(result.data)
+                for entry in entries_by_cover[cover_hash]:
+                    data_manager.set_cover(entry, result.data)
+            if on_progress is not None:
+                on_progress(done, len(entries_by_cover))
+    reclaimed = data_manager.compact_covers() if reencoded else 0
+    logger.info(_(F'Re-processed {len(entries_by_cover)} covers, {reencoded} re-encoded, {failed} failed, '
+                  F'{describe_savings(size_before, size_after)}'))
+    return ReprocessReport(len(entries_by_cover), reencoded, failed, size_before, size_after, reclaimed)
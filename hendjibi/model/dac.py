@@ -1,55 +1,364 @@
 import os
-import pickle
-from datetime import datetime
+import threading
 
+from hendjibi.model.backends import BackendType, ChangeSet, PickleBackend, SqliteBackend, COMPACT_THRESHOLD
+from hendjibi.model.blob_store import BlobStore
+from hendjibi.model.filters import FilterIndex
+from hendjibi.model.search import SearchIndex
+from hendjibi.model.sorting import SortedIndex, SortOrder
 from hendjibi.tools.app_logger import get_logger
+from hendjibi.tools.tracing import span, traced
 from hendjibi.tools.translator import translate as _
 
 logger = get_logger(__name__)
 
 
 class DataManager(object):
-    def __init__(self, file_path):
+    def __init__(self, file_path, journaled=True, compact_threshold=COMPACT_THRESHOLD, lazy_covers=True,
+                 backend=BackendType.PICKLE.value):
         self.file_path = file_path
-        self.all_entries = list()
-        if os.path.isfile(self.file_path):
-            try:
-                with open(self.file_path, 'rb') as the_file:
-                    data = the_file.read()
-                self.all_entries = self.load(data)
-            except EOFError as e:
-                logger.error(_(F'Failed to load entries data, runtime error is: {e}'))
-                logger.info(_('Created empty database, previous file renamed for safety'))
-                os.rename(self.file_path, F'{self.file_path}_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}')
-                with open(self.file_path, 'wb') as f:
-                    f.write(self.dump())
-            except Exception as e:
-                print(e)
+        self.lazy_covers = lazy_covers
+        self.covers = BlobStore(F'{self.file_path}.covers')
+        self._search_index = None
+        self._filter_index = None
+        self._sort_indexes = {}
+        self._duplicate_finder = None
+        # held while the duplicate finder is built, so it is only built once
+        self._duplicate_finder_lock = threading.Lock()
+        # guards entries and backend against the autosave thread
+        self.lock = threading.RLock()
+        # entries added or changed since the last save
+        self._changes = ChangeSet()
+        self._generation = 0
+        # called with (entry, changes) after every edit of a stored entry
+        self._subscribers = []
+        # set while an AutosaveService runs, a journal that reached its threshold is then compacted by it
+        self.background_compaction = False
+        try:
+            backend = BackendType(backend)
+        except ValueError:
+            logger.warning(_(F'Unknown storage backend {backend}, the pickle backend is used'))
+            backend = BackendType.PICKLE
+        if backend is BackendType.SQLITE:
+            self.backend = SqliteBackend(F'{os.path.splitext(self.file_path)[0]}.sqlite', legacy_path=self.file_path)
         else:
-            # no data
-            with open(file_path, 'wb') as f:
-                f.write(self.dump())
+            self.backend = PickleBackend(self.file_path, journaled, compact_threshold)
+        with span('DataManager.load', backend=backend.value):
+            self.all_entries = self.backend.load()
+        migrated_covers = self.migrate_covers()
+        if self.backend.needs_compaction or migrated_covers:
+            self.compact()
+        if self.lazy_covers:
+            # the snapshot holds metadata only, covers stay in the store until a tile asks for them
+            for entry in self.all_entries:
+                entry.cover_image = b''
+        else:
+            for entry in self.all_entries:
+                self.hydrate_cover(entry)
+
+    def migrate_covers(self):
+        migrated = 0
+        for entry in self.all_entries:
+            if entry.cover_image and not entry.cover_hash:
+                entry.cover_hash = self.covers.put(entry.cover_image)
+                migrated += 1
+        if migrated:
+            logger.info(_(F'Moved {migrated} inline covers into the cover store'))
+        return migrated
+
+    def hydrate_cover(self, entry):
+        if entry.cover_hash and not entry.cover_image:
+            entry.cover_image = self.covers.get(entry.cover_hash)
+        return entry.cover_image
+
+    def get_cover(self, entry):
+        if entry.cover_image:
+            return entry.cover_image
+        return self.covers.get(entry.cover_hash)
+
+    @property
+    def is_dirty(self):
+        return bool(self._changes)
+
+    @property
+    def changes(self):
+        """The ``ChangeSet`` of entries added or modified since the last save."""
+        return self._changes
+
+    def take_changes(self):
+        with self.lock:
+            changes, self._changes = self._changes, ChangeSet()
+            return changes
+
+    def restore_changes(self, changes):
+        # a save of ``changes`` failed, they stay pending for the next one
+        with self.lock:
+            self._changes.merge(changes)
 
-    def save_dump(self):
-        dump_data = self.dump()
+    @traced()
+    def compact(self):
+        with self.lock:
+            self.backend.save(self.all_entries)
+            self._changes = ChangeSet()
+            self._generation += 1
+
+    def _needs_full_save(self):
+        return self.backend.needs_compaction or not self.backend.persists_mutations
+
+    @traced()
+    def save(self):
+        """Persists the pending changes, the whole entry list is only rewritten when the backend needs it.
+
+        Returns the number of entries written.
+        """
+        with self.lock:
+            if self._needs_full_save():
+                written = len(self.all_entries) if self.is_dirty or self.backend.needs_compaction else 0
+                if written:
+                    self.compact()
+                return written
+            changes = self.take_changes()
+            try:
+                self.backend.save_changes(changes)
+            except Exception:
+                self.restore_changes(changes)
+                raise
+            return len(changes)
+
+    @traced()
+    def autosave(self):
+        """Saves the pending changes without blocking entry edits for long.
+
+        Backends that persist mutations as they happen only make the changes
+        durable. Otherwise a snapshot is captured under the lock and serialized
+        and written without holding it. Returns the number of entries written,
+        or None when there was nothing to save.
+        """
+        with self.lock:
+            if not self.is_dirty and not self.backend.needs_compaction:
+                return None
+            if not self._needs_full_save():
+                return self.save()
+            snapshot = self.backend.capture(self.all_entries)
+            generation = self._generation
+            changes = self.take_changes()
         try:
-            os.rename(self.file_path, F'{self.file_path}.bak')
-        except:
-            pass
-        with open(self.file_path, 'wb') as f:
-            f.write(dump_data)
+            written = self.backend.write_snapshot(snapshot)
+        except Exception:
+            self.restore_changes(changes)
+            raise
+        with self.lock:
+            if generation != self._generation:
+                # a compaction wrote a newer snapshot in the meantime
+                self.backend.discard_snapshot(written)
+                return None
+            try:
+                committed = self.backend.commit_snapshot(written)
+            except Exception:
+                self.backend.discard_snapshot(written)
+                self.restore_changes(changes)
+                raise
+            if committed:
+                # the journal was reset, mutations made after the capture go back into it
+                self.backend.add_many(list(self._changes.added.values()))
+                for entry, entry_changes in self._changes.changed_states():
+                    self.backend.update(entry, entry_changes)
+            self._generation += 1
+        return len(snapshot)
+
+    def close(self):
+        with self.lock:
+            self.save()
+            self.backend.close()
+        if self._duplicate_finder is not None:
+            from hendjibi.model.duplicates import save_hash_cache
+            save_hash_cache(F'{self.covers.file_path}.phash', self._duplicate_finder.cover_hashes)
+        self.covers.close()
 
-    def dump(self):
-        for e in self.all_entries:
-            e.dump()
-        return pickle.dumps(self.all_entries)
+    def compact_covers(self):
+        """Drops stored covers no entry refers to anymore, returns the bytes freed."""
+        with self.lock:
+            freed = self.covers.rewrite({entry.cover_hash for entry in self.all_entries})
+        if freed:
+            logger.info(_(F'Cover store compacted, {freed} bytes freed'))
+        return freed
 
-    @staticmethod
-    def load(dump_object):
-        return pickle.loads(dump_object)
+    def _persisted(self):
+        # compacting pickles the whole library, it is left to the autosave thread when there is one
+        if self.backend.needs_compaction and not self.background_compaction:
+            self.compact()
 
     def add_entry(self, new_entry):
-        self.all_entries.append(new_entry)
+        self.add_entries([new_entry])
+
+    @traced()
+    def add_entries(self, new_entries, compact=True):
+        # with compact=False the caller is expected to call save() once its bulk insert is over
+        for new_entry in new_entries:
+            if new_entry.cover_image:
+                new_entry.cover_hash = self.covers.put(new_entry.cover_image)
+                if self.lazy_covers:
+                    new_entry.cover_image = b''
+        with self.lock:
+            self.all_entries.extend(new_entries)
+            for new_entry in new_entries:
+                self._changes.add(new_entry)
+                if self._search_index is not None:
+                    self._search_index.add(new_entry)
+                if self._filter_index is not None:
+                    self._filter_index.add(new_entry)
+                for sort_index in self._sort_indexes.values():
+                    sort_index.add(new_entry)
+                if self._duplicate_finder is not None:
+                    self._index_duplicates(new_entry)
+            self.backend.add_many(new_entries)
+            if compact:
+                self._persisted()
+
+    @traced()
+    def update_entry(self, entry, mutate, *args):
+        with self.lock:
+            before = entry.__getstate__()
+            result = mutate(*args)
+            after = entry.__getstate__()
+            changes = {k: v for k, v in after.items() if k not in before or before[k] != v}
+            if changes:
+                self._record_changes(entry, changes)
+        if changes:
+            self.notify(entry, changes)
+        return result
+
+    def mark_changed(self, entry, changes=None):
+        """Records ``changes`` (state name -> new value) made to ``entry`` without ``update_entry``.
+
+        When ``changes`` is omitted the whole state of the entry is written.
+        """
+        if changes is None:
+            changes = entry.__getstate__()
+        self._record_changes(entry, changes)
+        self.notify(entry, changes)
+
+    def _record_changes(self, entry, changes):
+        with self.lock:
+            self._changes.change(entry, changes)
+            if self._search_index is not None:
+                self._search_index.update(entry)
+            if self._filter_index is not None:
+                self._filter_index.update(entry)
+            for sort_index in self._sort_indexes.values():
+                sort_index.update(entry)
+            if self._duplicate_finder is not None:
+                self._index_duplicates(entry)
+            self.backend.update(entry, changes)
+            self._persisted()
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def notify(self, entry, changes):
+        # subscribers run on the thread that made the edit, outside the lock
+        for callback in list(self._subscribers):
+            try:
+                callback(entry, changes)
+            except Exception as e:
+                logger.error(_(F'Entry subscriber failed due to: {e}'))
+
+    def set_progress(self, entry, progress_value):
+        self.update_entry(entry, entry.set_progress, progress_value)
+
+    def add_one_progress(self, entry):
+        self.update_entry(entry, entry.add_one_progress)
+
+    def set_status(self, entry, new_status):
+        self.update_entry(entry, entry.set_status, new_status)
+
+    def set_fields(self, entry, **fields):
+        self.update_entry(entry, entry.apply_changes, fields)
+
+    def set_cover(self, entry, cover_image):
+        self.set_fields(entry, cover_hash=self.covers.put(cover_image))
+        entry.cover_image = b'' if self.lazy_covers else cover_image
+
+    @property
+    def search_index(self):
+        # built on first use, then kept up to date by add_entry and update_entry
+        if self._search_index is None:
+            self._search_index = SearchIndex()
+            for entry in self.all_entries:
+                self._search_index.add(entry)
+        return self._search_index
+
+    @traced()
+    def search(self, query, limit=50):
+        return self.search_index.search(query, limit)
+
+    @property
+    def filter_index(self):
+        if self._filter_index is None:
+            self._filter_index = FilterIndex(self.all_entries)
+        return self._filter_index
+
+    @traced()
+    def query(self, query):
+        return self.filter_index.select(query)
+
+    def sort_index(self, order):
+        # one index per order that was asked for, each kept up to date like the filter index
+        order = SortOrder(order)
+        with self.lock:
+            if order not in self._sort_indexes:
+                with span('DataManager.sort_index', order=order.value):
+                    self._sort_indexes[order] = SortedIndex(order, self.all_entries)
+            return self._sort_indexes[order]
+
+    @property
+    def duplicate_finder(self):
+        # numpy and the cover decoding are only loaded once duplicates are looked for
+        if self._duplicate_finder is None:
+            return self.build_duplicate_finder()
+        return self._duplicate_finder
+
+    @property
+    def duplicate_finder_ready(self):
+        return self._duplicate_finder is not None
+
+    @traced()
+    def build_duplicate_finder(self):
+        """Builds the duplicate finder without holding the lock while covers are hashed.
+
+        Safe to call from a background thread, entries added or edited in the
+        meantime are indexed before the finder is put in use.
+        """
+        with self._duplicate_finder_lock:
+            if self._duplicate_finder is not None:
+                return self._duplicate_finder
+            from hendjibi.model.duplicates import build_finder
+            with self.lock:
+                entries = list(self.all_entries)
+            finder = build_finder(entries, self.covers, F'{self.covers.file_path}.phash')
+            with self.lock:
+                self._duplicate_finder = finder
+                for entry in self.all_entries:
+                    self._index_duplicates(entry)
+            return finder
+
+    def _index_duplicates(self, entry):
+        finder = self._duplicate_finder
+        if entry.cover_hash and entry.cover_hash not in finder.cover_hashes:
+            from hendjibi.model.duplicates import hash_cover_data
+            finder.cover_hashes.update(hash_cover_data([(entry.cover_hash, self.get_cover(entry))]))
+        finder.update(entry)
+
+    @traced()
+    def find_duplicates(self, entry):
+        return self.duplicate_finder.find(entry, self.get_cover(entry))
+
+    def duplicate_groups(self):
+        return self.duplicate_finder.groups()
 
     def iterate_entries(self):
         for entry in self.all_entries:
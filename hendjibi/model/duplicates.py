@@ -0,0 +1,326 @@
+import os
+import pickle
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from hendjibi.model.blob_store import BlobStore
+from hendjibi.model.covers import qt_worker_context
+from hendjibi.model.search import normalize
+from hendjibi.tools.app_logger import get_logger
+from hendjibi.tools.translator import translate as _
+
+logger = get_logger(__name__)
+
+HASH_IMAGE_SIZE = 32
+HASH_SIZE = 8
+# largest Hamming distances (out of 64 bits) still reported as the same cover
+PHASH_RADIUS = 6
+AHASH_RADIUS = 10
+SCAN_CHUNK_SIZE = 64
+TITLE_SEPARATORS_RE = re.compile(r'[,;/|]')
+NON_WORD_RE = re.compile(r'[\W_]+')
+LEADING_ARTICLES = ('the ', 'a ', 'an ')
+# cover_hashes value of a cover that could not be decoded
+UNDECODABLE = None
+
+
+def _dct_matrix(size):
+    k = np.arange(size).reshape(-1, 1)
+    n = np.arange(size).reshape(1, -1)
+    matrix = np.sqrt(2.0 / size) * np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+DCT_MATRIX = _dct_matrix(HASH_IMAGE_SIZE)
+
+
+def _pack_bits(bits):
+    # (count, 64) booleans -> 64 bit integers, most significant bit first
+    packed = np.packbits(bits.reshape(len(bits), -1), axis=1)
+    return [int(value) for value in packed.view('>u8').ravel()]
+
+
+def perceptual_hashes(pixels):
+    """DCT (pHash) and average (aHash) hashes for a ``(count, 32, 32)`` array of grayscale images."""
+    pixels = np.asarray(pixels, dtype=np.float64)
+    coefficients = DCT_MATRIX @ pixels @ DCT_MATRIX.T
+    low = coefficients[:, :HASH_SIZE, :HASH_SIZE].reshape(len(pixels), -1)
+    # the DC term only carries the overall brightness, it is left out of the median
+    phash_bits = low > np.median(low[:, 1:], axis=1, keepdims=True)
+    block = HASH_IMAGE_SIZE // HASH_SIZE
+    small = pixels.reshape(len(pixels), HASH_SIZE, block, HASH_SIZE, block).mean(axis=(2, 4))
+    ahash_bits = small > small.mean(axis=(1, 2), keepdims=True)
+    return list(zip(_pack_bits(phash_bits), _pack_bits(ahash_bits)))
+
+
+def decode_pixels(data):
+    # Qt is only needed once covers are decoded, importing it here keeps the model layer free of it
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtGui import QImage
+    image = QImage.fromData(data)
+    if image.isNull():
+        return None
+    # smooth scaling may hand back a 32 bit image, so the conversion comes last
+    image = image.scaled(HASH_IMAGE_SIZE, HASH_IMAGE_SIZE, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    image = image.convertToFormat(QImage.Format_Grayscale8)
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    rows = np.frombuffer(bits, dtype=np.uint8).reshape(HASH_IMAGE_SIZE, image.bytesPerLine())
+    return rows[:, :HASH_IMAGE_SIZE].copy()
+
+
+def hash_cover_data(covers):
+    """Perceptual hashes for ``(cover hash, bytes)`` pairs.
+
+    Covers that can not be decoded map to ``UNDECODABLE``, so they are not
+    decoded again.
+    """
+    covers = [(cover_hash, decode_pixels(data)) for cover_hash, data in covers]
+    decoded = [(cover_hash, pixels) for cover_hash, pixels in covers if pixels is not None]
+    hashes = {cover_hash: UNDECODABLE for cover_hash, pixels in covers if pixels is None}
+    if decoded:
+        values = perceptual_hashes(np.stack([pixels for cover_hash, pixels in decoded]))
+        hashes.update((cover_hash, value) for (cover_hash, pixels), value in zip(decoded, values))
+    return hashes
+
+
+_worker_store = None
+
+
+def _init_worker(store_path):
+    global _worker_store
+    _worker_store = BlobStore(store_path, read_only=True)
+
+
+def _hash_stored_covers(cover_hashes):
+    # runs in a worker process, covers are read from the worker's own view of the store
+    return hash_cover_data([(cover_hash, _worker_store.get(cover_hash)) for cover_hash in cover_hashes])
+
+
+def hash_stored_covers(store, cover_hashes, workers=None):
+    cover_hashes = list(cover_hashes)
+    if not cover_hashes:
+        return {}
+    chunks = [cover_hashes[i:i + SCAN_CHUNK_SIZE] for i in range(0, len(cover_hashes), SCAN_CHUNK_SIZE)]
+    hashes = {}
+    with ProcessPoolExecutor(workers, mp_context=qt_worker_context(), initializer=_init_worker,
+                             initargs=(store.file_path,)) as pool:
+        for chunk_hashes in pool.map(_hash_stored_covers, chunks):
+            hashes.update(chunk_hashes)
+    return hashes
+
+
+if hasattr(int, 'bit_count'):
+    bit_count = int.bit_count
+else:
+    def bit_count(value):
+        return bin(value).count('1')
+
+
+def hamming(a, b):
+    return bit_count(a ^ b)
+
+
+class BKTree(object):
+    """Burkhard-Keller tree over 64 bit hashes, queried by Hamming radius.
+
+    Nodes are ``[hash, items, {distance: child}]`` lists; the triangle inequality
+    limits every lookup to children whose edge distance is within the radius.
+    """
+
+    def __init__(self):
+        self.root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = [value, {item}, {}]
+            self._size += 1
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].add(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, {item}, {}]
+                self._size += 1
+                return
+            node = child
+
+    def discard(self, value, item):
+        node = self.root
+        while node is not None:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].discard(item)
+                return
+            node = node[2].get(distance)
+
+    def query(self, value, radius):
+        """Yields ``(distance, item)`` for every item stored within ``radius`` of ``value``."""
+        if self.root is None:
+            return
+        stack = [self.root]
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = bit_count(value ^ node_value)
+            if distance <= radius:
+                for item in items:
+                    yield distance, item
+            if len(children) > 2 * radius + 1:
+                for edge in range(max(distance - radius, 1), distance + radius + 1):
+                    child = children.get(edge)
+                    if child is not None:
+                        stack.append(child)
+            else:
+                for edge, child in children.items():
+                    if distance - radius <= edge <= distance + radius:
+                        stack.append(child)
+
+
+def normalize_title(title):
+    text = NON_WORD_RE.sub(' ', normalize(title)).strip()
+    for article in LEADING_ARTICLES:
+        if text.startswith(article):
+            text = text[len(article):]
+            break
+    return text
+
+
+def title_keys(entry):
+    keys = {normalize_title(entry.title_english), normalize_title(entry.title_original)}
+    keys.update(normalize_title(synonym) for synonym in TITLE_SEPARATORS_RE.split(entry.synonyms))
+    keys.discard('')
+    return keys
+
+
+class DuplicateFinder(object):
+    """Finds entries sharing a normalized title or a perceptually similar cover.
+
+    ``cover_hashes`` maps cover store hashes to ``(phash, ahash)`` pairs, or to
+    ``UNDECODABLE``; covers are matched when both hashes are within their
+    Hamming radius.
+    """
+
+    def __init__(self, cover_hashes=None, phash_radius=PHASH_RADIUS, ahash_radius=AHASH_RADIUS):
+        self.cover_hashes = cover_hashes if cover_hashes is not None else {}
+        self.phash_radius = phash_radius
+        self.ahash_radius = ahash_radius
+        self.tree = BKTree()
+        self._entries = {}
+        self._titles = defaultdict(set)  # normalized title -> uids
+        self._keys_by_uid = {}  # uid -> (title keys, cover hash)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entry):
+        if entry.uid in self._entries:
+            self.remove(entry.uid)
+        keys = title_keys(entry)
+        self._entries[entry.uid] = entry
+        self._keys_by_uid[entry.uid] = (keys, entry.cover_hash)
+        for key in keys:
+            self._titles[key].add(entry.uid)
+        hashes = self.cover_hashes.get(entry.cover_hash, UNDECODABLE)
+        if hashes is not UNDECODABLE:
+            self.tree.add(hashes[0], entry.uid)
+
+    def update(self, entry):
+        if self._keys_by_uid.get(entry.uid) != (title_keys(entry), entry.cover_hash):
+            self.add(entry)
+
+    def remove(self, uid):
+        self._entries.pop(uid, None)
+        keys, cover_hash = self._keys_by_uid.pop(uid, ((), ''))
+        for key in keys:
+            self._titles[key].discard(uid)
+            if not self._titles[key]:
+                del self._titles[key]
+        hashes = self.cover_hashes.get(cover_hash, UNDECODABLE)
+        if hashes is not UNDECODABLE:
+            self.tree.discard(hashes[0], uid)
+
+    def find(self, entry, cover_data=None):
+        """Returns ``(other entry, reason, distance)`` tuples, closest first.
+
+        ``cover_data`` lets entries whose cover is not hashed yet (a new entry) be
+        compared by cover too; it is hashed on the spot.
+        """
+        matches = {}
+        for key in title_keys(entry):
+            for uid in self._titles.get(key, ()):
+                matches[uid] = ('title', 0)
+        hashes = self.cover_hashes.get(entry.cover_hash, UNDECODABLE)
+        if entry.cover_hash not in self.cover_hashes and cover_data:
+            hashes = hash_cover_data([(entry.cover_hash, cover_data)])[entry.cover_hash]
+        if hashes is not UNDECODABLE:
+            phash, ahash = hashes
+            for distance, uid in self.tree.query(phash, self.phash_radius):
+                other_hashes = self.cover_hashes[self._keys_by_uid[uid][1]]
+                if hamming(ahash, other_hashes[1]) <= self.ahash_radius and uid not in matches:
+                    matches[uid] = ('cover', distance)
+        matches.pop(entry.uid, None)
+        return sorted(((self._entries[uid], reason, distance) for uid, (reason, distance) in matches.items()),
+                      key=lambda match: (match[2], str(match[0])))
+
+    def groups(self):
+        """Groups of two or more entries linked by shared titles or similar covers."""
+        parents = {uid: uid for uid in self._entries}
+
+        def root(uid):
+            while parents[uid] != uid:
+                parents[uid] = parents[parents[uid]]
+                uid = parents[uid]
+            return uid
+
+        for entry in self._entries.values():
+            for other, reason, distance in self.find(entry):
+                parents[root(other.uid)] = root(entry.uid)
+        grouped = defaultdict(list)
+        for uid, entry in self._entries.items():
+            grouped[root(uid)].append(entry)
+        return [group for group in grouped.values() if len(group) > 1]
+
+
+def load_hash_cache(file_path):
+    if not os.path.isfile(file_path):
+        return {}
+    try:
+        with open(file_path, 'rb') as the_file:
+            return pickle.load(the_file)
+    except Exception as e:
+        logger.error(_(F'Failed to load perceptual hash cache, runtime error is: {e}'))
+        return {}
+
+
+def save_hash_cache(file_path, cover_hashes):
+    tmp_path = F'{file_path}.tmp'
+    with open(tmp_path, 'wb') as the_file:
+        pickle.dump(cover_hashes, the_file, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, file_path)
+
+
+def build_finder(entries, store, cache_path=None, workers=None):
+    """Hashes every cover not yet in the cache across worker processes and indexes ``entries``."""
+    cover_hashes = load_hash_cache(cache_path) if cache_path else {}
+    missing = {entry.cover_hash for entry in entries if entry.cover_hash and entry.cover_hash not in cover_hashes}
+    if missing:
+        logger.info(_(F'Computing perceptual hashes of {len(missing)} covers'))
+        cover_hashes.update(hash_stored_covers(store, missing, workers))
+        if cache_path:
+            save_hash_cache(cache_path, cover_hashes)
+    finder = DuplicateFinder(cover_hashes)
+    for entry in entries:
+        finder.add(entry)
+    return finder
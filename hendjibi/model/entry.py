@@ -1,7 +1,11 @@
 import pickle
+import uuid
 from datetime import date
 from enum import Enum
 
+# entries stored before the date they were added was recorded count as added on the first possible day
+LEGACY_DATE_ADDED = date.min.toordinal()
+
 
 class EntryStatus(Enum):
     UNKNOWN = 'Unknown'
@@ -31,7 +35,32 @@ class EntryType(Enum):
     UNKNOWN = 'Unknown'
 
 
+def _enum_property(slot, enum_type):
+    members = list(enum_type)
+    indexes = {member: index for index, member in enumerate(members)}
+    return property(lambda self: members[getattr(self, slot)],
+                    lambda self, value: setattr(self, slot, indexes[value]))
+
+
+def _date_property(slot):
+    return property(lambda self: date.fromordinal(getattr(self, slot)),
+                    lambda self, value: setattr(self, slot, value.toordinal()))
+
+
 class GenericEntry(object):
+    # enums are kept as their index in the enum (so new members must be appended) and dates as ordinals,
+    # the public attributes below convert on access
+    __slots__ = ('cover_image', 'title_english', 'title_original', 'synonyms', '_release_date1', '_release_date2',
+                 '_entry_status', 'description', 'nsfw', '_entry_type', 'progress', 'max_progress',
+                 '_progress_status', 'uid', 'cover_hash', '_date_added')
+
+    release_date1 = _date_property('_release_date1')
+    release_date2 = _date_property('_release_date2')
+    date_added = _date_property('_date_added')
+    entry_status = _enum_property('_entry_status', EntryStatus)
+    entry_type = _enum_property('_entry_type', EntryType)
+    progress_status = _enum_property('_progress_status', ProgressStatus)
+
     def __init__(self,
                  cover_image=b'',
                  title_english='',
@@ -60,6 +89,9 @@ class GenericEntry(object):
         self.progress = progress  # type: int
         self.max_progress = max_progress  # type: int
         self.progress_status = progress_status  # type: ProgressStatus
+        self.uid = uuid.uuid4().hex  # type: str
+        self.cover_hash = ''  # type: str
+        self.date_added = date.today()  # type: date
 
     def set_status(self, new_status):
         self.entry_status = new_status
@@ -68,12 +100,12 @@ class GenericEntry(object):
 
     def add_one_progress(self):
         self.progress += 1
-        if self.entry_status is EntryStatus.COMPLETED:
+        if self.entry_status is EntryStatus.FINISHED:
             if self.progress == self.max_progress:
                 self.progress_status = ProgressStatus.COMPLETED
 
     def set_progress(self, progress_value):
-        if self.entry_status is EntryStatus.COMPLETED:
+        if self.entry_status is EntryStatus.FINISHED:
             self.progress = min(progress_value, self.max_progress)
             if self.progress == self.max_progress:
                 self.progress_status = ProgressStatus.COMPLETED
@@ -106,12 +138,67 @@ class GenericEntry(object):
         return pickle.dumps(self)
 
     def __getstate__(self):
-        state = self.__dict__.copy()
+        state = {name: getattr(self, name) for name in GenericEntry.__slots__}
+        # cover bytes live in the blob store, only their hash is persisted
+        if state['cover_hash']:
+            del state['cover_image']
         return state
 
+    def __reduce__(self):
+        cover_image = b'' if self.cover_hash else self.cover_image
+        return _restore_entry, (cover_image, self.title_english, self.title_original, self.synonyms,
+                                self._release_date1, self._release_date2, self._entry_status, self.description,
+                                self.nsfw, self._entry_type, self.progress, self.max_progress,
+                                self._progress_status, self.uid, self.cover_hash, self._date_added)
+
+    def snapshot(self):
+        return EntrySnapshot(self.__reduce__()[1])
+
     def __setstate__(self, state):
-        self.__dict__.update(state)
+        self.uid = uuid.uuid4().hex
+        self.cover_hash = ''
+        self.cover_image = b''
+        self._date_added = LEGACY_DATE_ADDED
+        # states pickled before __slots__ use the public names with enum and date values,
+        # setattr routes those through the converting properties
+        for name, value in state.items():
+            try:
+                setattr(self, name, value)
+            except AttributeError:
+                pass
+
+    def apply_changes(self, changes):
+        for name, value in changes.items():
+            setattr(self, name, value)
+
+    @staticmethod
+    def from_state(state):
+        entry = GenericEntry.__new__(GenericEntry)
+        entry.__setstate__(state)
+        return entry
 
     @staticmethod
     def load_dumped(dump_object):
         return pickle.loads(dump_object)
+
+
+def _restore_entry(*values):
+    entry = GenericEntry.__new__(GenericEntry)
+    if len(values) < len(GenericEntry.__slots__):
+        # pickled before date_added existed
+        values += (LEGACY_DATE_ADDED,)
+    (entry.cover_image, entry.title_english, entry.title_original, entry.synonyms, entry._release_date1,
+     entry._release_date2, entry._entry_status, entry.description, entry.nsfw, entry._entry_type, entry.progress,
+     entry.max_progress, entry._progress_status, entry.uid, entry.cover_hash, entry._date_added) = values
+    return entry
+
+
+class EntrySnapshot(object):
+    """Frozen copy of an entry's values that pickles exactly like the entry it was taken from."""
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = values
+
+    def __reduce__(self):
+        return _restore_entry, self.values
@@ -0,0 +1,257 @@
+import csv
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from enum import Enum
+from functools import partial
+
+from hendjibi.model.blob_store import hash_blob
+from hendjibi.model.covers import COVER_MAX_BYTES, COVER_MAX_DIMENSION, InvalidCoverError, process_cover, \
+    qt_worker_context
+from hendjibi.model.entry import GenericEntry, EntryStatus, EntryType, ProgressStatus
+from hendjibi.tools.app_logger import get_logger
+from hendjibi.tools.translator import translate as _
+
+logger = get_logger(__name__)
+
+IMPORT_BATCH_SIZE = 500
+COVERS_DIRECTORY_SUFFIX = '_covers'
+EXCHANGE_FIELDS = ('uid', 'title_english', 'title_original', 'synonyms', 'release_date1', 'release_date2',
+                   'entry_status', 'description', 'nsfw', 'entry_type', 'progress', 'max_progress',
+                   'progress_status', 'date_added', 'cover')
+DATE_FIELDS = ('release_date1', 'release_date2', 'date_added')
+INT_FIELDS = ('progress', 'max_progress')
+ENUM_FIELDS = {
+    'entry_status': EntryStatus,
+    'entry_type': EntryType,
+    'progress_status': ProgressStatus,
+}
+IMAGE_SIGNATURES = (
+    (b'\x89PNG', 'png'),
+    (b'\xff\xd8', 'jpg'),
+    (b'GIF8', 'gif'),
+    (b'RIFF', 'webp'),
+    (b'BM', 'bmp'),
+)
+
+
+class ExchangeFormat(Enum):
+    JSONL = 'jsonl'
+    CSV = 'csv'
+
+    @staticmethod
+    def from_path(file_path):
+        extension = os.path.splitext(file_path)[1].lower().lstrip('.')
+        if extension == 'json':
+            return ExchangeFormat.JSONL
+        try:
+            return ExchangeFormat(extension)
+        except ValueError:
+            raise ValueError(_(F'Unsupported exchange file: {file_path}'))
+
+
+def covers_directory(file_path):
+    return F'{os.path.splitext(file_path)[0]}{COVERS_DIRECTORY_SUFFIX}'
+
+
+def image_extension(data):
+    for signature, extension in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    return 'bin'
+
+
+def entry_to_record(entry, cover_name=''):
+    record = {name: getattr(entry, name) for name in EXCHANGE_FIELDS if name != 'cover'}
+    for name in DATE_FIELDS:
+        record[name] = record[name].isoformat()
+    for name in ENUM_FIELDS:
+        record[name] = record[name].value
+    record['cover'] = cover_name
+    return record
+
+
+def record_to_entry(record):
+    # values may come from CSV, so everything is accepted as text
+    entry = GenericEntry()
+    for name in ('title_english', 'title_original', 'synonyms', 'description'):
+        entry_value = record.get(name)
+        if entry_value is not None:
+            setattr(entry, name, str(entry_value))
+    for name in DATE_FIELDS:
+        if record.get(name):
+            setattr(entry, name, date.fromisoformat(record[name]))
+    for name, enum_type in ENUM_FIELDS.items():
+        if record.get(name):
+            setattr(entry, name, enum_type(record[name]))
+    for name in INT_FIELDS:
+        if record.get(name) not in (None, ''):
+            setattr(entry, name, int(record[name]))
+    nsfw = record.get('nsfw', False)
+    entry.nsfw = nsfw if isinstance(nsfw, bool) else str(nsfw).strip().lower() in ('1', 'true', 'yes')
+    if record.get('uid'):
+        entry.uid = record['uid']
+    return entry
+
+
+def read_jsonl(file_path):
+    with open(file_path, 'r', encoding='utf-8') as the_file:
+        for line_number, line in enumerate(the_file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                logger.error(_(F'Skipped line {line_number} of {file_path}, runtime error is: {e}'))
+                continue
+            if not isinstance(record, dict):
+                logger.error(_(F'Skipped line {line_number} of {file_path}, it does not hold an entry'))
+                continue
+            yield record
+
+
+def read_csv(file_path):
+    with open(file_path, 'r', encoding='utf-8', newline='') as the_file:
+        for record in csv.DictReader(the_file):
+            yield record
+
+
+def write_jsonl(records, file_path):
+    count = 0
+    with open(file_path, 'w', encoding='utf-8') as the_file:
+        for record in records:
+            the_file.write(json.dumps(record, ensure_ascii=False))
+            the_file.write('\n')
+            count += 1
+    return count
+
+
+def write_csv(records, file_path):
+    count = 0
+    with open(file_path, 'w', encoding='utf-8', newline='') as the_file:
+        writer = csv.DictWriter(the_file, EXCHANGE_FIELDS)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            count += 1
+    return count
+
+
+READERS = {ExchangeFormat.JSONL: read_jsonl, ExchangeFormat.CSV: read_csv}
+WRITERS = {ExchangeFormat.JSONL: write_jsonl, ExchangeFormat.CSV: write_csv}
+
+
+def _export_records(data_manager, directory):
+    written = set()
+    for entry in data_manager.iterate_entries():
+        cover_name = ''
+        cover = data_manager.get_cover(entry)
+        if cover:
+            cover_hash = entry.cover_hash or hash_blob(cover)
+            cover_name = F'{cover_hash}.{image_extension(cover)}'
+            # covers are shared between entries, each one is written once
+            if cover_name not in written:
+                written.add(cover_name)
+                cover_path = os.path.join(directory, cover_name)
+                if not os.path.isfile(cover_path):
+                    with open(cover_path, 'wb') as the_file:
+                        the_file.write(cover)
+        yield entry_to_record(entry, cover_name)
+
+
+def export_entries(data_manager, file_path):
+    """Streams every entry to a JSON Lines or CSV file, covers go next to it as one file per image."""
+    write = WRITERS[ExchangeFormat.from_path(file_path)]
+    directory = covers_directory(file_path)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = F'{file_path}.tmp'
+    count = write(_export_records(data_manager, directory), tmp_path)
+    os.replace(tmp_path, file_path)
+    logger.info(_(F'Exported {count} entries to {file_path}'))
+    return count
+
+
+def load_cover(cover_path, max_dimension=COVER_MAX_DIMENSION, max_bytes=COVER_MAX_BYTES):
+    # runs in a worker process, covers go through the same ingestion as those added in the GUI
+    try:
+        with open(cover_path, 'rb') as the_file:
+            data = process_cover(the_file.read(), max_dimension, max_bytes).data
+    except (OSError, InvalidCoverError) as e:
+        logger.warning(_(F'Could not read cover {cover_path}, runtime error is: {e}'))
+        return '', b''
+    return hash_blob(data), data
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _known_cover(cover_name, covers):
+    # exported covers are named after their hash, those already stored are not read again
+    cover_hash = os.path.splitext(cover_name)[0]
+    return cover_hash if cover_hash in covers else ''
+
+
+def _import_batch(records, directory, data_manager, pool, load):
+    entries = []
+    to_load = []
+    for record in records:
+        try:
+            entry = record_to_entry(record)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(_(F'Skipped record {record.get("uid", "")}, runtime error is: {e}'))
+            continue
+        cover_name = record.get('cover') or ''
+        if cover_name:
+            entry.cover_hash = _known_cover(cover_name, data_manager.covers)
+            if not entry.cover_hash:
+                to_load.append((entry, os.path.join(directory, cover_name)))
+        entries.append(entry)
+    loaded = pool.map(load, [cover_path for entry, cover_path in to_load], chunksize=16) if to_load else ()
+    for (entry, cover_path), (cover_hash, data) in zip(to_load, loaded):
+        entry.cover_hash = data_manager.covers.put(data, cover_hash)
+    data_manager.add_entries(entries, compact=False)
+    return entries
+
+
+def import_entries(data_manager, file_path, batch_size=IMPORT_BATCH_SIZE, on_batch=None,
+                   max_cover_dimension=COVER_MAX_DIMENSION, max_cover_bytes=COVER_MAX_BYTES):
+    """Streams entries from a JSON Lines or CSV file into ``data_manager``.
+
+    Records are read lazily and inserted in batches of ``batch_size``, while the
+    cover files of each batch are read, downscaled to the cover caps and hashed
+    in a process pool. Entries whose uid is already known are skipped.
+    ``on_batch`` receives every inserted batch.
+    """
+    load = partial(load_cover, max_dimension=max_cover_dimension, max_bytes=max_cover_bytes)
+    directory = covers_directory(file_path)
+    records = READERS[ExchangeFormat.from_path(file_path)](file_path)
+    known_uids = {entry.uid for entry in data_manager.iterate_entries()}
+    count = 0
+    with ProcessPoolExecutor(mp_context=qt_worker_context()) as pool:
+        for chunk in chunked(records, batch_size):
+            batch = []
+            for record in chunk:
+                if record.get('uid'):
+                    if record['uid'] in known_uids:
+                        continue
+                    known_uids.add(record['uid'])
+                batch.append(record)
+            if not batch:
+                continue
+            entries = _import_batch(batch, directory, data_manager, pool, load)
+            count += len(entries)
+            if on_batch is not None:
+                on_batch(entries)
+    # the batches are already in the backend, only a journal that grew past its threshold is compacted
+    data_manager.save()
+    logger.info(_(F'Imported {count} entries from {file_path}'))
+    return count
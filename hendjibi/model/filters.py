@@ -0,0 +1,218 @@
+import bisect
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from operator import attrgetter
+
+CATEGORY_ATTRIBUTES = ('entry_type', 'progress_status', 'entry_status', 'nsfw')
+RANGE_ATTRIBUTES = ('progress', 'max_progress', 'release_date1', 'release_date2')
+get_category_values = attrgetter(*CATEGORY_ATTRIBUTES)
+get_range_values = attrgetter(*RANGE_ATTRIBUTES)
+
+
+def bits_to_bitmap(bits):
+    bits = list(bits)
+    if not bits:
+        return 0
+    buffer = bytearray(max(bits) // 8 + 1)
+    for bit in bits:
+        buffer[bit >> 3] |= 1 << (bit & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def iter_bits(bitmap):
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for byte_index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield byte_index * 8 + low.bit_length() - 1
+            byte ^= low
+
+
+class Query(ABC):
+    @abstractmethod
+    def evaluate(self, index):
+        pass
+
+    @abstractmethod
+    def matches(self, entry):
+        pass
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+class Everything(Query):
+    def evaluate(self, index):
+        return index.all_bits
+
+    def matches(self, entry):
+        return True
+
+
+class Attr(Query):
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def evaluate(self, index):
+        return index.bitmap(self.name, self.value)
+
+    def matches(self, entry):
+        return getattr(entry, self.name) == self.value
+
+
+class Range(Query):
+    """Inclusive range on a numeric or date attribute, ``None`` leaves that side open."""
+
+    def __init__(self, name, low=None, high=None):
+        self.name = name
+        self.low = low
+        self.high = high
+
+    def evaluate(self, index):
+        return index.range_bitmap(self.name, self.low, self.high)
+
+    def matches(self, entry):
+        value = getattr(entry, self.name)
+        return (self.low is None or value >= self.low) and (self.high is None or value <= self.high)
+
+
+class And(Query):
+    def __init__(self, *queries):
+        self.queries = queries
+
+    def evaluate(self, index):
+        bitmap = index.all_bits
+        for query in self.queries:
+            bitmap &= query.evaluate(index)
+        return bitmap
+
+    def matches(self, entry):
+        return all(query.matches(entry) for query in self.queries)
+
+
+class Or(Query):
+    def __init__(self, *queries):
+        self.queries = queries
+
+    def evaluate(self, index):
+        bitmap = 0
+        for query in self.queries:
+            bitmap |= query.evaluate(index)
+        return bitmap
+
+    def matches(self, entry):
+        return any(query.matches(entry) for query in self.queries)
+
+
+class Not(Query):
+    def __init__(self, query):
+        self.query = query
+
+    def evaluate(self, index):
+        return index.all_bits & ~self.query.evaluate(index)
+
+    def matches(self, entry):
+        return not self.query.matches(entry)
+
+
+class FilterIndex(object):
+    """Bitmap indexes over entry attributes.
+
+    Every entry owns one bit position; categorical attributes keep one bitmap
+    (a Python int) per value and range attributes keep a sorted ``(value, bit)``
+    list, so compound queries reduce to bitwise operations.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = []
+        self.all_bits = 0
+        self._positions = {}  # uid -> bit
+        self._bitmaps = {}  # (attribute, value) -> bitmap
+        # range attribute -> sorted (value, bit) pairs, built on the first range query
+        self._sorted = None
+        self._values = []  # bit -> indexed attribute values
+        self._bulk_add(entries)
+
+    def _bulk_add(self, entries):
+        bits_by_key = defaultdict(list)
+        for entry in entries:
+            bit = self._allocate(entry)
+            for key in zip(CATEGORY_ATTRIBUTES, self._values[bit][0]):
+                bits_by_key[key].append(bit)
+        for key, bits in bits_by_key.items():
+            self._bitmaps[key] = self._bitmaps.get(key, 0) | bits_to_bitmap(bits)
+        self.all_bits = (1 << len(self.entries)) - 1
+
+    def _allocate(self, entry):
+        bit = len(self.entries)
+        self.entries.append(entry)
+        self._positions[entry.uid] = bit
+        self._values.append(self._index_values(entry))
+        return bit
+
+    @staticmethod
+    def _index_values(entry):
+        return get_category_values(entry), get_range_values(entry)
+
+    def _set_bit(self, bit):
+        category_values, range_values = self._values[bit]
+        for key in zip(CATEGORY_ATTRIBUTES, category_values):
+            self._bitmaps[key] = self._bitmaps.get(key, 0) | 1 << bit
+        if self._sorted is not None:
+            for name, value in zip(RANGE_ATTRIBUTES, range_values):
+                bisect.insort(self._sorted[name], (value, bit))
+
+    def _clear_bit(self, bit):
+        category_values, range_values = self._values[bit]
+        for key in zip(CATEGORY_ATTRIBUTES, category_values):
+            self._bitmaps[key] &= ~(1 << bit)
+        if self._sorted is not None:
+            for name, value in zip(RANGE_ATTRIBUTES, range_values):
+                sorted_values = self._sorted[name]
+                del sorted_values[bisect.bisect_left(sorted_values, (value, bit))]
+
+    def position(self, entry):
+        return self._positions.get(entry.uid)
+
+    def add(self, entry):
+        bit = self._allocate(entry)
+        self._set_bit(bit)
+        self.all_bits |= 1 << bit
+
+    def update(self, entry):
+        bit = self._positions.get(entry.uid)
+        if bit is None:
+            self.add(entry)
+            return
+        values = self._index_values(entry)
+        if values != self._values[bit]:
+            self._clear_bit(bit)
+            self._values[bit] = values
+            self._set_bit(bit)
+
+    def bitmap(self, name, value):
+        return self._bitmaps.get((name, value), 0)
+
+    def _sorted_values(self, name):
+        if self._sorted is None:
+            self._sorted = {}
+            for position, range_name in enumerate(RANGE_ATTRIBUTES):
+                self._sorted[range_name] = sorted(
+                    (range_values[position], bit) for bit, (category_values, range_values) in enumerate(self._values))
+        return self._sorted[name]
+
+    def range_bitmap(self, name, low=None, high=None):
+        sorted_values = self._sorted_values(name)
+        start = 0 if low is None else bisect.bisect_left(sorted_values, (low, -1))
+        end = len(sorted_values) if high is None else bisect.bisect_right(sorted_values, (high, len(self.entries)))
+        return bits_to_bitmap(bit for value, bit in sorted_values[start:end])
+
+    def select(self, query):
+        return [self.entries[bit] for bit in iter_bits(query.evaluate(self))]
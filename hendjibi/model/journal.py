@@ -0,0 +1,86 @@
+import os
+import pickle
+import struct
+from enum import Enum
+
+from hendjibi.tools.app_logger import get_logger
+from hendjibi.tools.translator import translate as _
+
+logger = get_logger(__name__)
+
+RECORD_HEADER = struct.Struct('<I')
+
+
+class JournalOp(Enum):
+    ADD = 'add'
+    UPDATE = 'update'
+
+
+class Journal(object):
+    """Append-only log of entry mutations stored next to the snapshot file.
+
+    Every record is a length-prefixed pickle, so a record torn by a crash
+    is detected on replay and the journal is truncated before it.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.record_count = 0
+        self._handle = None
+
+    def append(self, op, uid, payload):
+        data = pickle.dumps((op.value, uid, payload), pickle.HIGHEST_PROTOCOL)
+        if self._handle is None:
+            self._handle = open(self.file_path, 'ab')
+        self._handle.write(RECORD_HEADER.pack(len(data)) + data)
+        self._handle.flush()
+        self.record_count += 1
+
+    def sync(self):
+        if self._handle is not None:
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+
+    def replay(self):
+        if not os.path.isfile(self.file_path):
+            return
+        torn = False
+        good_end = 0
+        with open(self.file_path, 'rb') as the_file:
+            while True:
+                header = the_file.read(RECORD_HEADER.size)
+                if not header:
+                    break
+                if len(header) < RECORD_HEADER.size:
+                    logger.warning(_(F'Journal {self.file_path} ends with a torn record, ignoring it'))
+                    torn = True
+                    break
+                size, = RECORD_HEADER.unpack(header)
+                data = the_file.read(size)
+                if len(data) < size:
+                    logger.warning(_(F'Journal {self.file_path} ends with a torn record, ignoring it'))
+                    torn = True
+                    break
+                try:
+                    op, uid, payload = pickle.loads(data)
+                except Exception as e:
+                    logger.error(_(F'Failed to read journal record, runtime error is: {e}'))
+                    torn = True
+                    break
+                good_end = the_file.tell()
+                self.record_count += 1
+                yield JournalOp(op), uid, payload
+        if torn:
+            # records appended after the bad bytes would never be replayed, they are cut off first
+            os.truncate(self.file_path, good_end)
+
+    def truncate(self):
+        self.close()
+        with open(self.file_path, 'wb'):
+            pass
+        self.record_count = 0
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
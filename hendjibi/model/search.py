@@ -0,0 +1,122 @@
+import heapq
+import re
+import unicodedata
+from collections import defaultdict
+
+SEARCHED_FIELDS = {
+    'title_english': 3.0,
+    'title_original': 3.0,
+    'synonyms': 2.0,
+    'description': 1.0,
+}
+TOKEN_RE = re.compile(r'\w+')
+MIN_SIMILARITY = 0.35
+PREFIX_SIMILARITY = 0.9
+
+
+def normalize(text):
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def trigrams(token):
+    padded = F'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex(object):
+    """Inverted index over entry text fields with a trigram index over its vocabulary.
+
+    Query tokens are matched exactly, as prefixes or by trigram similarity, so
+    lookups cost depends on the vocabulary size rather than on the number of
+    entries, and single typos still find their titles.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(dict)  # token -> {uid: weight}
+        self._trigrams = defaultdict(set)  # trigram -> tokens
+        self._tokens_by_uid = {}  # uid -> {token: weight}
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _weighted_tokens(entry):
+        weights = {}
+        for field, weight in SEARCHED_FIELDS.items():
+            for token in tokenize(getattr(entry, field)):
+                weights[token] = max(weights.get(token, 0.0), weight)
+        return weights
+
+    def add(self, entry):
+        if entry.uid in self._entries:
+            self.remove(entry.uid)
+        weights = self._weighted_tokens(entry)
+        self._entries[entry.uid] = entry
+        self._tokens_by_uid[entry.uid] = weights
+        for token, weight in weights.items():
+            postings = self._postings[token]
+            if not postings:
+                for trigram in trigrams(token):
+                    self._trigrams[trigram].add(token)
+            postings[entry.uid] = weight
+
+    def update(self, entry):
+        if self._tokens_by_uid.get(entry.uid) != self._weighted_tokens(entry):
+            self.add(entry)
+
+    def remove(self, uid):
+        self._entries.pop(uid, None)
+        for token in self._tokens_by_uid.pop(uid, {}):
+            postings = self._postings[token]
+            postings.pop(uid, None)
+            if not postings:
+                del self._postings[token]
+                for trigram in trigrams(token):
+                    self._trigrams[trigram].discard(token)
+                    if not self._trigrams[trigram]:
+                        del self._trigrams[trigram]
+
+    def _similar_tokens(self, query_token):
+        query_trigrams = trigrams(query_token)
+        shared = defaultdict(int)
+        for trigram in query_trigrams:
+            for token in self._trigrams.get(trigram, ()):
+                shared[token] += 1
+        matches = {}
+        for token, count in shared.items():
+            if token == query_token:
+                similarity = 1.0
+            elif token.startswith(query_token):
+                similarity = PREFIX_SIMILARITY
+            else:
+                # a padded token has len(token) + 1 trigrams
+                similarity = count / (len(query_trigrams) + len(token) + 1 - count)
+            if similarity >= MIN_SIMILARITY:
+                matches[token] = similarity
+        return matches
+
+    def search(self, query, limit=50):
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+        scores = None
+        for query_token in query_tokens:
+            token_scores = defaultdict(float)
+            for token, similarity in self._similar_tokens(query_token).items():
+                for uid, weight in self._postings[token].items():
+                    token_scores[uid] = max(token_scores[uid], similarity * weight)
+            if scores is None:
+                scores = token_scores
+            else:
+                # every query token has to match something in the entry
+                scores = {uid: score + token_scores[uid] for uid, score in scores.items() if uid in token_scores}
+            if not scores:
+                return []
+        ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], str(self._entries[item[0]])))
+        return [self._entries[uid] for uid, score in ranked]
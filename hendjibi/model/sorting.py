@@ -0,0 +1,112 @@
+import bisect
+import locale
+from enum import Enum
+
+from hendjibi.tools.app_logger import get_logger
+from hendjibi.tools.translator import translate as _
+
+logger = get_logger(__name__)
+
+
+class SortOrder(Enum):
+    TITLE = 'title'
+    RELEASE_DATE = 'release_date'
+    PROGRESS = 'progress'
+    DATE_ADDED = 'date_added'
+
+
+SORT_ORDER_NAMES = {
+    SortOrder.TITLE: _('Title'),
+    SortOrder.RELEASE_DATE: _('Release date'),
+    SortOrder.PROGRESS: _('Progress'),
+    SortOrder.DATE_ADDED: _('Date added'),
+}
+
+
+def init_collation():
+    # titles are compared with the user's collation rules instead of code points
+    try:
+        locale.setlocale(locale.LC_COLLATE, '')
+    except locale.Error as e:
+        logger.warning(_(F'Could not use the system collation, titles sort by code point: {e}'))
+
+
+def title_key(entry):
+    return locale.strxfrm(str(entry).casefold())
+
+
+def progress_ratio(entry):
+    if entry.max_progress > 0:
+        return entry.progress / entry.max_progress
+    return 0.0
+
+
+# primary key of each order, newest release and furthest progress come first
+SORT_KEYS = {
+    SortOrder.TITLE: title_key,
+    SortOrder.RELEASE_DATE: lambda entry: -entry.release_date1.toordinal(),
+    SortOrder.PROGRESS: lambda entry: -progress_ratio(entry),
+    SortOrder.DATE_ADDED: lambda entry: entry.date_added.toordinal(),
+}
+
+
+class SortedIndex(object):
+    """Entries ordered by one ``SortOrder``, kept sorted as entries are added and edited.
+
+    Keys are computed once per entry and change, as ``(primary key, sequence,
+    uid)`` where the sequence is the insertion order, so ties keep the order
+    entries were added in and every key is unique. Adding or re-keying an entry
+    is a bisection.
+    """
+
+    def __init__(self, order, entries=()):
+        self.order = order
+        self.primary_key = SORT_KEYS[order]
+        self.keys = {}  # uid -> key
+        self.entries = {}  # uid -> entry
+        self._next_sequence = 0
+        for entry in entries:
+            self.keys[entry.uid] = self._key(entry, self._allocate())
+            self.entries[entry.uid] = entry
+        self.sorted_keys = sorted(self.keys.values())
+
+    def __len__(self):
+        return len(self.sorted_keys)
+
+    def __iter__(self):
+        entries = self.entries
+        return (entries[key[2]] for key in self.sorted_keys)
+
+    def _allocate(self):
+        sequence = self._next_sequence
+        self._next_sequence += 1
+        return sequence
+
+    def _key(self, entry, sequence):
+        return self.primary_key(entry), sequence, entry.uid
+
+    def key(self, entry):
+        return self.keys[entry.uid]
+
+    def add(self, entry):
+        if entry.uid in self.keys:
+            self.update(entry)
+            return
+        key = self._key(entry, self._allocate())
+        self.keys[entry.uid] = key
+        self.entries[entry.uid] = entry
+        bisect.insort(self.sorted_keys, key)
+
+    def update(self, entry):
+        """Moves ``entry`` to its new place, returns whether its key changed."""
+        old_key = self.keys[entry.uid]
+        key = self._key(entry, old_key[1])
+        if key == old_key:
+            return False
+        del self.sorted_keys[bisect.bisect_left(self.sorted_keys, old_key)]
+        bisect.insort(self.sorted_keys, key)
+        self.keys[entry.uid] = key
+        return True
+
+    def position(self, entry):
+        return bisect.bisect_left(self.sorted_keys, self.keys[entry.uid])
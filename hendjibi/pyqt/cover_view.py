@@ -0,0 +1,279 @@
+import bisect
+import heapq
+import math
+from collections import defaultdict
+from operator import itemgetter
+
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, QRect, QPoint
+from PyQt5.QtGui import QPainter
+from PyQt5.QtWidgets import QListView, QStyledItemDelegate, QStyle, QAbstractItemView, QFrame, QSizePolicy
+
+ENTRY_ROLE = Qt.UserRole + 1
+TILE_PADDING = 4
+
+
+class EntryListModel(QAbstractListModel):
+    """Entries shown in one type/progress status group, ordered by a ``SortedIndex``.
+
+    Every row keeps the key it was inserted with, so rows are found, added and
+    removed by bisection whatever the index has changed since.
+    """
+
+    def __init__(self, cover_loader, thumbnail_loader, sort_index, parent=None):
+        QAbstractListModel.__init__(self, parent)
+        self.entries = []
+        self.sort_index = sort_index
+        self.cover_loader = cover_loader
+        self.thumbnail_loader = thumbnail_loader
+        self._keys = []  # sort keys, row by row
+        self._row_keys = {}  # uid -> sort key of its row
+        self._uids_by_cover = defaultdict(set)  # cover hash -> uids of the rows showing it
+        self._row_covers = {}  # uid -> cover hash its row is listed under in _uids_by_cover
+        thumbnail_loader.thumbnail_ready.connect(self.thumbnail_ready)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.entries)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self.entries):
+            return None
+        entry = self.entries[index.row()]
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return repr(entry)
+        if role == Qt.DecorationRole:
+            return self.cover(entry)
+        if role == ENTRY_ROLE:
+            return entry
+        return None
+
+    def cover(self, entry):
+        # data() is only asked for cells being painted, so only visible covers get decoded;
+        # until the thumbnail arrives from the loader the delegate paints a placeholder
+        if not entry.cover_hash:
+            return None
+        self.thumbnail_loader.request(entry.cover_hash, lambda: self.cover_loader(entry))
+        return self.thumbnail_loader.get(entry.cover_hash)
+
+    def thumbnail_ready(self, cover_hash):
+        # only the rows showing this cover are repainted
+        for uid in self._uids_by_cover.get(cover_hash, ()):
+            index = self.index(self.row_of_uid(uid))
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def add_entries(self, entries):
+        """Inserts ``entries`` in sort order.
+
+        Entries that all sort after the last row, which is how the grid is
+        populated, are appended; a single entry goes to its bisected row and
+        anything else is merged into the rows in one pass.
+        """
+        if not entries:
+            return
+        added = sorted((self.sort_index.key(entry), entry) for entry in entries)
+        for key, entry in added:
+            self._row_keys[entry.uid] = key
+            self._index_cover(entry)
+        if not self._keys or added[0][0] > self._keys[-1]:
+            first_row = len(self.entries)
+            self.beginInsertRows(QModelIndex(), first_row, first_row + len(added) - 1)
+            self._keys.extend(key for key, entry in added)
+            self.entries.extend(entry for key, entry in added)
+            self.endInsertRows()
+        elif len(added) == 1:
+            key, entry = added[0]
+            row = bisect.bisect_left(self._keys, key)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._keys.insert(row, key)
+            self.entries.insert(row, entry)
+            self.endInsertRows()
+        else:
+            self.beginResetModel()
+            merged = list(heapq.merge(zip(self._keys, self.entries), added, key=itemgetter(0)))
+            self._keys = [key for key, entry in merged]
+            self.entries = [entry for key, entry in merged]
+            self.endResetModel()
+
+    def add_entry(self, entry):
+        self.add_entries([entry])
+
+    def _index_cover(self, entry):
+        self._uids_by_cover[entry.cover_hash].add(entry.uid)
+        self._row_covers[entry.uid] = entry.cover_hash
+
+    def _unindex_cover(self, entry):
+        cover_hash = self._row_covers.pop(entry.uid)
+        uids = self._uids_by_cover[cover_hash]
+        uids.discard(entry.uid)
+        if not uids:
+            del self._uids_by_cover[cover_hash]
+
+    def remove_entry(self, entry):
+        row = self.row_of(entry)
+        del self._row_keys[entry.uid]
+        self._unindex_cover(entry)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._keys[row]
+        del self.entries[row]
+        self.endRemoveRows()
+
+    def entry_changed(self, entry):
+        row = self.row_of(entry)
+        if self._row_covers[entry.uid] != entry.cover_hash:
+            self._unindex_cover(entry)
+            self._index_cover(entry)
+        self.dataChanged.emit(self.index(row), self.index(row))
+
+    def is_sorted(self, entry):
+        """Whether the row of ``entry`` still matches its key in the sort index."""
+        return self._row_keys[entry.uid] == self.sort_index.key(entry)
+
+    def set_sort_index(self, sort_index, entries):
+        """Shows ``entries``, already in ``sort_index`` order, without resetting the view.
+
+        Persistent indexes (selection and hidden rows) follow their entries.
+        """
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        uids = [self.entries[index.row()].uid for index in persistent]
+        self.sort_index = sort_index
+        self.entries = list(entries)
+        self._keys = [sort_index.key(entry) for entry in self.entries]
+        self._row_keys = {entry.uid: key for entry, key in zip(self.entries, self._keys)}
+        self.changePersistentIndexList(persistent, [self.index(self.row_of_uid(uid)) for uid in uids])
+        self.layoutChanged.emit()
+
+    def row_of_uid(self, uid):
+        key = self._row_keys.get(uid)
+        if key is None:
+            return None
+        return bisect.bisect_left(self._keys, key)
+
+    def row_of(self, entry):
+        return self.row_of_uid(entry.uid)
+
+
+class CoverDelegate(QStyledItemDelegate):
+    def __init__(self, cover_size, parent=None):
+        QStyledItemDelegate.__init__(self, parent)
+        self.cover_size = cover_size
+
+    def tile_size(self, font_metrics):
+        return QSize(self.cover_size + 2 * TILE_PADDING,
+                     self.cover_size + font_metrics.height() + 3 * TILE_PADDING)
+
+    def sizeHint(self, option, index):
+        return self.tile_size(option.fontMetrics)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        rect = option.rect.adjusted(TILE_PADDING, TILE_PADDING, -TILE_PADDING, -TILE_PADDING)
+        text_height = option.fontMetrics.height()
+        cover_rect = QRect(rect.x(), rect.y(), rect.width(), rect.height() - text_height - TILE_PADDING)
+        pixmap = index.data(Qt.DecorationRole)
+        if pixmap is not None and not pixmap.isNull():
+            target = QRect(QPoint(0, 0), pixmap.size().scaled(cover_rect.size(), Qt.KeepAspectRatio))
+            target.moveCenter(cover_rect.center())
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.drawPixmap(target, pixmap)
+        else:
+            painter.setPen(option.palette.mid().color())
+            painter.drawRect(cover_rect)
+        if option.state & QStyle.State_Selected:
+            painter.setPen(option.palette.highlightedText().color())
+        else:
+            painter.setPen(option.palette.text().color())
+        text_rect = QRect(rect.x(), cover_rect.bottom() + TILE_PADDING, rect.width(), text_height)
+        text = option.fontMetrics.elidedText(index.data(Qt.DisplayRole), Qt.ElideRight, rect.width())
+        painter.drawText(text_rect, Qt.AlignHCenter | Qt.AlignVCenter, text)
+        painter.restore()
+
+
+class CoverListView(QListView):
+    """Non-scrolling wrapped grid of covers that is sized to fit all of its rows.
+
+    The enclosing scroll area does the scrolling, Qt only delivers paint events
+    for the exposed part of the viewport and ``QListView`` paints just the cells
+    intersecting it.
+    """
+
+    def __init__(self, model, delegate, parent=None):
+        QListView.__init__(self, parent)
+        self.available_width = 0
+        self.hidden_uids = set()
+        self.setModel(model)
+        self.setItemDelegate(delegate)
+        self.setViewMode(QListView.ListMode)
+        self.setFlow(QListView.LeftToRight)
+        self.setWrapping(True)
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setFrameShape(QFrame.NoFrame)
+        self.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        self.viewport().setAutoFillBackground(False)
+        self.update_tile_size()
+        model.rowsInserted.connect(self.updateGeometry)
+        model.rowsRemoved.connect(self.updateGeometry)
+        model.modelReset.connect(self._restore_hidden_rows)
+
+    def update_tile_size(self):
+        self.setGridSize(self.itemDelegate().tile_size(self.fontMetrics()))
+        self.updateGeometry()
+
+    def set_available_width(self, width):
+        if width != self.available_width:
+            self.available_width = width
+            self.updateGeometry()
+
+    def set_row_hidden(self, row, hidden):
+        # tracked by uid, rows shift as entries are inserted in sort order
+        uid = self.model().entries[row].uid
+        if hidden:
+            self.hidden_uids.add(uid)
+        else:
+            self.hidden_uids.discard(uid)
+        self.setRowHidden(row, hidden)
+        self.updateGeometry()
+
+    def is_hidden(self, entry):
+        return entry.uid in self.hidden_uids
+
+    def _restore_hidden_rows(self):
+        # a model reset forgets hidden rows
+        model = self.model()
+        for uid in self.hidden_uids:
+            self.setRowHidden(model.row_of_uid(uid), True)
+        self.updateGeometry()
+
+    def insert_entry(self, entry, hidden):
+        self.model().add_entry(entry)
+        if hidden:
+            self.set_row_hidden(self.model().row_of(entry), True)
+
+    def remove_entry(self, entry):
+        self.hidden_uids.discard(entry.uid)
+        self.model().remove_entry(entry)
+
+    def sizeHint(self):
+        count = self.model().rowCount() - len(self.hidden_uids)
+        tile = self.gridSize()
+        if count == 0:
+            return QSize(tile.width(), 0)
+        columns = max(1, min(count, self.available_width // tile.width()))
+        rows = math.ceil(count / columns)
+        # one spare pixel keeps QListView from wrapping the last column
+        return QSize(columns * tile.width() + 1, rows * tile.height() + 1)
+
+    def minimumSizeHint(self):
+        return self.sizeHint()
+
+    def wheelEvent(self, e):
+        # let the enclosing scroll area handle scrolling
+        e.ignore()
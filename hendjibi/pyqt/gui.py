@@ -1,10 +1,14 @@
 import atexit
+import os
 import random
 import sys
+import threading
 
 from PyQt5 import QtCore, QtGui, QtWidgets
+from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtGui import QPalette, QIcon
-from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox, QAction, QFileDialog, QDesktopWidget
+from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox, QAction, QFileDialog, QDesktopWidget, \
+    QProgressBar, QActionGroup
 
 from hendjibi import PROJECT_NAME
 from hendjibi.pyqt.consts import QCOLOR_DARK, QCOLOR_HIGHLIGHT, QCOLOR_WHITE
@@ -12,12 +16,20 @@ from hendjibi.pyqt.widgets import MainWidget, NewEntryDialog
 from hendjibi.tools.app_logger import get_logger
 from hendjibi.tools.misc import get_resource_path
 from hendjibi.tools.translator import translate as _
+from hendjibi.model.autosave import AutosaveService
 from hendjibi.model.dac import DataManager
-from hendjibi.model.entry import EntryType, ProgressStatus
+from hendjibi.model.entry import EntryType, ProgressStatus, EntryStatus
+from hendjibi.model.exchange import ExchangeFormat, export_entries, import_entries
+from hendjibi.model.sorting import SortOrder, SORT_ORDER_NAMES
+from hendjibi.tools.config import entry_status_property
 
 logger = get_logger(__name__)
 
 
+POPULATION_BAR_WIDTH = 250
+DUPLICATES_SHOWN = 5
+EXCHANGE_FILE_FILTER = 'JSON Lines (*.jsonl *.json);;CSV (*.csv)'
+
 GUI_HINTS = [
     '',
 ]
@@ -54,6 +66,10 @@ class Application(QApplication):
 
 
 class GUI(QMainWindow):
+    # emitted from the import thread, delivered on the GUI thread
+    imported = pyqtSignal(object)
+    import_finished = pyqtSignal(str)
+
     def __init__(self, qt_app, config):
         QMainWindow.__init__(self)
         self.set_dark_palette = None
@@ -62,9 +78,23 @@ class GUI(QMainWindow):
         self.qt_app = qt_app
         self.config = config
         self.setWindowTitle(PROJECT_NAME)
-        self.data_manager = DataManager(self.config.data_dump_path)
+        self.data_manager = DataManager(self.config.data_dump_path, self.config.journaled_storage,
+                                        self.config.journal_compact_threshold, self.config.lazy_covers,
+                                        self.config.storage_backend)
+        self.autosave = AutosaveService(self.data_manager, self.config.autosave_interval)
+        self.autosave.start()
+        # covers are hashed for duplicate checks in the background, the first new entry does not wait for it
+        threading.Thread(target=self.build_duplicate_finder, name='duplicates', daemon=True).start()
+        self.import_thread = None
+        self.imported.connect(self.imported_batch)
+        self.import_finished.connect(self.import_done)
         self.main_widget = MainWidget(self.config, self.data_manager)
         self.main_widget.connect_actions(self.show_msg_on_status_bar)
+        self.population_bar = QProgressBar()
+        self.population_bar.setMaximumWidth(POPULATION_BAR_WIDTH)
+        self.statusBar().addPermanentWidget(self.population_bar)
+        self.main_widget.population_progress.connect(self.population_progress)
+        self.population_progress(self.main_widget.population_done, self.main_widget.population_total)
         self.setCentralWidget(self.main_widget)
         self.init_menu_bar()
         self.change_sot(self.config.stay_on_top)
@@ -81,16 +111,51 @@ class GUI(QMainWindow):
         self.set_default_palette = set_default_palette
 
     def import_db(self):
-        # TODO
-        path = str(QFileDialog.getExistingDirectory(self, _('Select Directory')))
-        if path:
-            self.show_msg_on_status_bar(_(F'Loaded DB from {self.config.db_path}'))
+        if self.import_thread is not None:
+            self.show_msg_on_status_bar(_('An import is already running'))
+            return
+        path, _selected_filter = QFileDialog.getOpenFileName(self, _('Import entries'), '', EXCHANGE_FILE_FILTER)
+        if not path:
+            return
+        # records are read and covers processed on their own thread, batches reach the grid as they are stored
+        self.show_msg_on_status_bar(_(F'Importing entries from {path}...'))
+        self.import_thread = threading.Thread(target=self.run_import, args=(path,), name='import', daemon=True)
+        self.import_thread.start()
+
+    def run_import(self, path):
+        try:
+            count = import_entries(self.data_manager, path, on_batch=self.imported.emit,
+                                   max_cover_dimension=self.config.cover_max_dimension,
+                                   max_cover_bytes=self.config.cover_max_kb * 1024)
+            message = _(F'Imported {count} entries from {path}')
+        except Exception as e:
+            logger.error(_(F'Import from {path} failed due to: {e}'))
+            message = _(F'Import from {path} failed')
+        self.import_finished.emit(message)
+
+    def import_done(self, message):
+        self.import_thread = None
+        self.show_msg_on_status_bar(message)
+
+    def imported_batch(self, entries):
+        if entries:
+            self.main_widget.add_entries(entries)
 
     def export_db(self):
-        # TODO
-        path = str(QFileDialog.getExistingDirectory(self, _('Select Directory')))
-        if path:
-            self.show_msg_on_status_bar(_(F'Loaded DB from {self.config.db_path}'))
+        path, _selected_filter = QFileDialog.getSaveFileName(self, _('Export entries'), '', EXCHANGE_FILE_FILTER)
+        if not path:
+            return
+        if not os.path.splitext(path)[1]:
+            path = F'{path}.{ExchangeFormat.JSONL.value}'
+        QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            count = export_entries(self.data_manager, path)
+            self.show_msg_on_status_bar(_(F'Exported {count} entries to {path}'))
+        except (OSError, ValueError) as e:
+            logger.error(_(F'Export to {path} failed due to: {e}'))
+            self.show_msg_on_status_bar(_(F'Export to {path} failed'))
+        finally:
+            QApplication.restoreOverrideCursor()
 
     def filter_type_changed(self, entry_name, is_checked):
         setattr(self.config, entry_name.lower(), is_checked)
@@ -100,12 +165,20 @@ class GUI(QMainWindow):
         setattr(self.config, entry_name.lower(), is_checked)
         self.main_widget.filter_status_changed(entry_name, is_checked)
 
-    def add_filter(self, name, filter_menu, function):
+    def filter_entry_status_changed(self, entry_name, is_checked):
+        setattr(self.config, entry_status_property(EntryStatus(entry_name)), is_checked)
+        self.main_widget.filter_entry_status_changed(entry_name, is_checked)
+
+    def filter_nsfw_changed(self, hide_nsfw):
+        # MainWidget is subscribed to this setting
+        self.config.hide_nsfw = hide_nsfw
+
+    def add_filter(self, name, filter_menu, function, config_name=None):
         a = QAction(_(name), self)
         a.setCheckable(True)
         a.triggered.connect(lambda: function(name, a.isChecked()))
         filter_menu.addAction(a)
-        a.setChecked(not getattr(self.config, name.lower()))
+        a.setChecked(not getattr(self.config, config_name or name.lower()))
         a.trigger()
 
     def init_menu_bar(self):
@@ -114,6 +187,7 @@ class GUI(QMainWindow):
         entry_menu = menu_bar.addMenu(_('Entry'))
         filter_menu = menu_bar.addMenu(_('Filter'))
         view_menu = menu_bar.addMenu(_('View'))
+        sort_menu = menu_bar.addMenu(_('Sort'))
 
         redraw_on_release_grid_action = QAction(_('Refresh on slider release'), self)
         redraw_on_release_grid_action.setCheckable(True)
@@ -123,11 +197,11 @@ class GUI(QMainWindow):
         redraw_on_release_grid_action.setChecked(self.config.redraw_on_release)
         self.change_redraw_on_release(self.config.redraw_on_release)
 
-        imp_act = QAction(_('Import db'), self)
+        imp_act = QAction(_('Import entries'), self)
         imp_act.triggered.connect(self.import_db)
         file_menu.addAction(imp_act)
 
-        exp_act = QAction(_('Export db'), self)
+        exp_act = QAction(_('Export entries'), self)
         exp_act.triggered.connect(self.export_db)
         file_menu.addAction(exp_act)
 
@@ -143,6 +217,19 @@ class GUI(QMainWindow):
         view_menu.addAction(dark_mode)
         dark_mode.setChecked(self.config.dark_mode)
 
+        cache_stats = QAction(_('Cover cache statistics'), self)
+        cache_stats.triggered.connect(self.show_cache_stats)
+        view_menu.addAction(cache_stats)
+
+        sort_group = QActionGroup(self)
+        for order in SortOrder:
+            sort_action = QAction(SORT_ORDER_NAMES[order], self)
+            sort_action.setCheckable(True)
+            sort_action.setChecked(order is self.main_widget.sort_index.order)
+            sort_action.setActionGroup(sort_group)
+            sort_action.triggered.connect(lambda checked, order=order: self.main_widget.set_sort_order(order))
+            sort_menu.addAction(sort_action)
+
         new_entry = QAction(_('Add new entry'), self)
         new_entry.triggered.connect(self.add_new_entry)
         entry_menu.addAction(new_entry)
@@ -156,6 +243,19 @@ class GUI(QMainWindow):
         for entry_status in ProgressStatus:
             self.add_filter(entry_status.value, filter_menu, self.filter_status_changed)
 
+        filter_menu.addSeparator()
+        filter_menu.addSection('Entry status')
+        for entry_status in EntryStatus:
+            self.add_filter(entry_status.value, filter_menu, self.filter_entry_status_changed,
+                            entry_status_property(entry_status))
+
+        filter_menu.addSeparator()
+        hide_nsfw = QAction(_('Hide NSFW'), self)
+        hide_nsfw.setCheckable(True)
+        hide_nsfw.triggered.connect(lambda: self.filter_nsfw_changed(hide_nsfw.isChecked()))
+        filter_menu.addAction(hide_nsfw)
+        hide_nsfw.setChecked(self.config.hide_nsfw)
+
     def change_redraw_on_release(self, redraw_on_release):
         self.config.redraw_on_release = redraw_on_release
         self.main_widget.change_slider_action(redraw_on_release)
@@ -170,8 +270,14 @@ class GUI(QMainWindow):
     def before_exit(self):
         self.config.width = self.frameSize().width()
         self.config.height = self.frameSize().height()
-        self.config.write_config()
-        self.data_manager.save_dump()
+        self.main_widget.store_cover_size()
+        self.config.flush()
+        self.main_widget.thumbnail_loader.shutdown()
+        if self.import_thread is not None:
+            # the entries of a running import are stored before the library is closed
+            self.import_thread.join()
+        self.autosave.stop()
+        self.data_manager.close()
 
     def change_sot(self, is_checked):
         self.config.stay_on_top = is_checked
@@ -183,6 +289,24 @@ class GUI(QMainWindow):
             self.setWindowFlags(flags & ~hint)
         self.show()
 
+    def build_duplicate_finder(self):
+        try:
+            self.data_manager.build_duplicate_finder()
+        except Exception as e:
+            logger.error(_(F'Duplicate detection is unavailable due to: {e}'))
+
+    def population_progress(self, done, total):
+        self.population_bar.setMaximum(max(total, 1))
+        self.population_bar.setValue(done)
+        self.population_bar.setFormat(_(F'Loading entries %v/{total}'))
+        self.population_bar.setVisible(done < total)
+
+    def show_cache_stats(self):
+        stats = self.main_widget.thumbnail_loader.stats()
+        self.show_msg_on_status_bar(_(
+            F'Covers in memory: {stats["entries"]}, {stats["bytes"] / 2 ** 20:.1f}/{stats["max_bytes"] / 2 ** 20:.0f} MB, '
+            F'hit rate {stats["hit_rate"]:.0%}, {stats["evictions"]} evictions'))
+
     def show_msg_on_status_bar(self, string: str = ''):
         self.statusBar().showMessage(string)
 
@@ -193,10 +317,22 @@ class GUI(QMainWindow):
         QtWidgets.QMainWindow.resizeEvent(self, event)
 
     def add_new_entry(self):
-        my_dialog = NewEntryDialog(self)
+        my_dialog = NewEntryDialog(self, self.config.cover_max_dimension, self.config.cover_max_kb * 1024)
         my_dialog.exec_()
         if my_dialog.submitted is True:
             new_entry = my_dialog.get_values()
+            duplicates = []
+            if self.data_manager.duplicate_finder_ready:
+                duplicates = self.data_manager.find_duplicates(new_entry)
+            else:
+                self.show_msg_on_status_bar(_('Covers are still being indexed, duplicates were not checked'))
+            if duplicates:
+                listing = '\n'.join(F'{entry} ({reason})' for entry, reason, distance in duplicates[:DUPLICATES_SHOWN])
+                answer = QMessageBox.question(self, _('Possible duplicate'),
+                                              _(F'This entry looks like:\n{listing}\n\nAdd it anyway?'),
+                                              QMessageBox.Yes | QMessageBox.No)
+                if answer != QMessageBox.Yes:
+                    return
             self.data_manager.add_entry(new_entry)
             self.main_widget.add_entry(new_entry)
 
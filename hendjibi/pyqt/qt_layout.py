@@ -1,6 +1,10 @@
 from PyQt5.QtCore import pyqtSignal, QRect, QSize, Qt, QPoint
 from PyQt5.QtWidgets import QLayout, QSpacerItem, QSizePolicy
 
+from hendjibi.tools.tracing import traced
+
+MAX_CACHED_ARRANGEMENTS = 32
+
 
 class FlowLayout(QLayout):
     # Credit to https://stackoverflow.com/a/46727466/4984268
@@ -16,18 +20,29 @@ class FlowLayout(QLayout):
 
     def __init__(self, parent=None, margin=0, spacing=-1):
         super().__init__(parent)
+        # set up before the margins and spacing, both call invalidate()
+        self._item_list = []
+        # cached per item size hints, dropped on invalidate()
+        self._hints = []
+        self._item_spacing = None
+        # width -> (item positions relative to the content origin, content height)
+        self._arrangements = {}
+        self._last_rect = None
+        self._last_height = None
+
         if parent is not None:
             self.setContentsMargins(margin, margin, margin, margin)
         self.setSpacing(spacing)
 
-        self._item_list = []
-
     def __del__(self):
         while self.count():
             self.takeAt(0)
 
     def addItem(self, item):
         self._item_list.append(item)
+        self._hints.append(None)
+        self._arrangements.clear()
+        self._last_rect = None
 
     def addSpacing(self, size):
         self.addItem(QSpacerItem(size, 0, QSizePolicy.Fixed, QSizePolicy.Minimum))
@@ -42,9 +57,19 @@ class FlowLayout(QLayout):
 
     def takeAt(self, index):
         if 0 <= index < len(self._item_list):
+            self._hints.pop(index)
+            self._arrangements.clear()
+            self._last_rect = None
             return self._item_list.pop(index)
         return None
 
+    def invalidate(self):
+        self._hints = [None] * len(self._item_list)
+        self._item_spacing = None
+        self._arrangements.clear()
+        self._last_rect = None
+        super().invalidate()
+
     def expandingDirections(self):
         return Qt.Orientations(Qt.Orientation(0))
 
@@ -57,7 +82,8 @@ class FlowLayout(QLayout):
 
     def setGeometry(self, rect):
         super().setGeometry(rect)
-        self._do_layout(rect, False)
+        if rect != self._last_rect:
+            self._do_layout(rect, False)
 
     def sizeHint(self):
         return self.minimumSize()
@@ -74,37 +100,67 @@ class FlowLayout(QLayout):
         size += QSize(2 * margin, 2 * margin)
         return size
 
-    def _do_layout(self, rect, test_only=False):
-        m = self.contentsMargins()
-        effective_rect = rect.adjusted(+m.left(), +m.top(), -m.right(), -m.bottom())
-        x = effective_rect.x()
-        y = effective_rect.y()
+    def _spacing_for(self, item):
+        if self._item_spacing is None:
+            space_x = space_y = self.spacing()
+            for other in self._item_list:
+                wid = other.widget()
+                if wid is not None:
+                    space_x += wid.style().layoutSpacing(
+                        QSizePolicy.PushButton, QSizePolicy.PushButton, Qt.Horizontal)
+                    space_y += wid.style().layoutSpacing(
+                        QSizePolicy.PushButton, QSizePolicy.PushButton, Qt.Vertical)
+                    break
+            self._item_spacing = (space_x, space_y)
+        if item.widget() is None:
+            return self.spacing(), self.spacing()
+        return self._item_spacing
+
+    def _size_hint_at(self, index):
+        hint = self._hints[index]
+        if hint is None:
+            hint = self._item_list[index].sizeHint()
+            self._hints[index] = hint
+        return hint
+
+    @traced()
+    def _arrange(self, width):
+        arrangement = self._arrangements.get(width)
+        if arrangement is not None:
+            return arrangement
+        positions = []
+        x = 0
+        y = 0
         line_height = 0
-
-        for item in self._item_list:
-            wid = item.widget()
-
-            space_x = self.spacing()
-            space_y = self.spacing()
-            if wid is not None:
-                space_x += wid.style().layoutSpacing(
-                    QSizePolicy.PushButton, QSizePolicy.PushButton, Qt.Horizontal)
-                space_y += wid.style().layoutSpacing(
-                    QSizePolicy.PushButton, QSizePolicy.PushButton, Qt.Vertical)
-
-            next_x = x + item.sizeHint().width() + space_x
-            if next_x - space_x > effective_rect.right() and line_height > 0:
-                x = effective_rect.x()
+        for index, item in enumerate(self._item_list):
+            space_x, space_y = self._spacing_for(item)
+            hint = self._size_hint_at(index)
+            if x + hint.width() > width - 1 and line_height > 0:
+                x = 0
                 y = y + line_height + space_y
-                next_x = x + item.sizeHint().width() + space_x
                 line_height = 0
-
-            if not test_only:
-                item.setGeometry(QRect(QPoint(x, y), item.sizeHint()))
-
-            x = next_x
-            line_height = max(line_height, item.sizeHint().height())
-
-        new_height = y + line_height - rect.y()
-        self.heightChanged.emit(new_height)
+            positions.append(QPoint(x, y))
+            x = x + hint.width() + space_x
+            line_height = max(line_height, hint.height())
+        if len(self._arrangements) >= MAX_CACHED_ARRANGEMENTS:
+            self._arrangements.clear()
+        arrangement = (positions, y + line_height)
+        self._arrangements[width] = arrangement
+        return arrangement
+
+    @traced()
+    def _do_layout(self, rect, test_only=False):
+        m = self.contentsMargins()
+        effective_rect = rect.adjusted(+m.left(), +m.top(), -m.right(), -m.bottom())
+        positions, content_height = self._arrange(effective_rect.width())
+
+        new_height = content_height + m.top()
+        if not test_only:
+            origin = effective_rect.topLeft()
+            for index, item in enumerate(self._item_list):
+                item.setGeometry(QRect(origin + positions[index], self._size_hint_at(index)))
+            self._last_rect = QRect(rect)
+            if new_height != self._last_height:
+                self._last_height = new_height
+                self.heightChanged.emit(new_height)
         return new_height
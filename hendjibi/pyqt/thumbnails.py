@@ -0,0 +1,177 @@
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QBuffer, QIODevice, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+
+from hendjibi.tools.app_logger import get_logger
+from hendjibi.tools.config import SLIDER_MAX
+from hendjibi.tools.thumbnail_cache import bucket_for
+
+logger = get_logger(__name__)
+
+PIXMAP_CACHE_BYTES = 128 * 1024 * 1024
+
+
+def encode_image(image):
+    buffer = QBuffer()
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, 'PNG' if image.hasAlphaChannel() else 'JPG', 90)
+    return bytes(buffer.data())
+
+
+class ThumbnailSignals(QObject):
+    finished = pyqtSignal(str, int, QImage)
+
+
+class ThumbnailTask(QRunnable):
+    def __init__(self, cover_hash, cover_bytes, bucket, disk_cache, signals):
+        QRunnable.__init__(self)
+        self.cover_hash = cover_hash
+        self.cover_bytes = cover_bytes
+        self.bucket = bucket
+        self.disk_cache = disk_cache
+        self.signals = signals
+
+    def run(self):
+        image = QImage()
+        cached = self.disk_cache.get(self.cover_hash, self.bucket) if self.disk_cache is not None else None
+        if cached is not None and image.loadFromData(cached):
+            self.signals.finished.emit(self.cover_hash, self.bucket, image)
+            return
+        if self.cover_bytes is not None and image.loadFromData(self.cover_bytes):
+            if image.width() > self.bucket or image.height() > self.bucket:
+                image = image.scaled(self.bucket, self.bucket, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            if self.disk_cache is not None:
+                self.disk_cache.put(self.cover_hash, self.bucket, encode_image(image))
+        else:
+            logger.warning(F'Could not decode cover {self.cover_hash}')
+        self.signals.finished.emit(self.cover_hash, self.bucket, image)
+
+
+def pixmap_cost(pixmap):
+    return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+
+class PixmapCache(object):
+    """LRU cache of decoded thumbnails bounded by their pixel memory.
+
+    Only tiles being painted look pixmaps up, so covers scrolled out of view are
+    the first to be evicted; they are decoded again (usually from the disk cache)
+    when they come back.
+    """
+
+    def __init__(self, max_bytes=PIXMAP_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._pixmaps = OrderedDict()  # (cover hash, bucket) -> pixmap
+        self._latest = {}  # cover hash -> key of the most recently cached bucket
+
+    def __contains__(self, key):
+        return key in self._pixmaps
+
+    def __len__(self):
+        return len(self._pixmaps)
+
+    def get(self, key):
+        pixmap = self._pixmaps.get(key)
+        if pixmap is None:
+            self.misses += 1
+            # show a thumbnail from another bucket while the right one is being prepared
+            latest = self._latest.get(key[0])
+            return self._pixmaps.get(latest) if latest is not None else None
+        self.hits += 1
+        self._pixmaps.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        if key in self._pixmaps:
+            self.bytes -= pixmap_cost(self._pixmaps.pop(key))
+        self._pixmaps[key] = pixmap
+        self._latest[key[0]] = key
+        self.bytes += pixmap_cost(pixmap)
+        self._evict(keep=key)
+
+    def set_max_bytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def _evict(self, keep=None):
+        while self.bytes > self.max_bytes and self._pixmaps:
+            key, pixmap = next(iter(self._pixmaps.items()))
+            if key == keep:
+                break
+            del self._pixmaps[key]
+            self.bytes -= pixmap_cost(pixmap)
+            self.evictions += 1
+            if self._latest.get(key[0]) == key:
+                del self._latest[key[0]]
+
+    def clear(self):
+        self._pixmaps.clear()
+        self._latest.clear()
+        self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._pixmaps),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+        }
+
+
+class ThumbnailLoader(QObject):
+    """Decodes and scales covers on a thread pool.
+
+    Workers produce ``QImage`` thumbnails for the size bucket matching the current
+    cover size, reading them from the on-disk cache when possible, and the GUI
+    thread turns them into pixmaps once they are delivered through ``thumbnail_ready``.
+    """
+    thumbnail_ready = pyqtSignal(str)
+
+    def __init__(self, thumbnail_size=SLIDER_MAX, disk_cache=None, cache_bytes=PIXMAP_CACHE_BYTES, parent=None):
+        QObject.__init__(self, parent)
+        self.bucket = bucket_for(thumbnail_size)
+        self.disk_cache = disk_cache
+        self.pixmaps = PixmapCache(cache_bytes)
+        self._pending = set()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max(1, QThreadPool.globalInstance().maxThreadCount() - 1))
+        self._signals = ThumbnailSignals(self)
+        self._signals.finished.connect(self._on_finished)
+
+    def set_thumbnail_size(self, thumbnail_size):
+        self.bucket = bucket_for(thumbnail_size)
+
+    def get(self, cover_hash):
+        return self.pixmaps.get((cover_hash, self.bucket))
+
+    def request(self, cover_hash, cover_loader):
+        key = (cover_hash, self.bucket)
+        if key in self._pending or key in self.pixmaps:
+            return
+        self._pending.add(key)
+        cover_bytes = None
+        if self.disk_cache is None or key not in self.disk_cache:
+            cover_bytes = cover_loader()
+        self._pool.start(ThumbnailTask(cover_hash, cover_bytes, self.bucket, self.disk_cache, self._signals))
+
+    def _on_finished(self, cover_hash, bucket, image):
+        self._pending.discard((cover_hash, bucket))
+        self.pixmaps.put((cover_hash, bucket), QPixmap.fromImage(image))
+        self.thumbnail_ready.emit(cover_hash)
+
+    def stats(self):
+        return self.pixmaps.stats()
+
+    def shutdown(self):
+        self._pool.clear()
+        self._pool.waitForDone()
+        logger.info(F'Pixmap cache statistics: {self.stats()}')
@@ -1,14 +1,28 @@
+import itertools
+import os
+import time
+from collections import deque, defaultdict
+
 from PyQt5 import QtCore
-from PyQt5.QtCore import Qt, QSize
-from PyQt5.QtGui import QPaintEvent, QPainter, QIcon, QPixmap, QIntValidator, QFont, QColor, QPalette
-from PyQt5.QtWidgets import QWidget, QPushButton, QVBoxLayout, QHBoxLayout, QListWidget, QScrollArea, QGroupBox, \
-    QSlider, QDialog, QLabel, QLineEdit, QCheckBox, QComboBox, QPlainTextEdit, QFileDialog, QDateEdit, QToolButton
+from PyQt5.QtCore import Qt, QObject, QTimer, pyqtSignal
+from PyQt5.QtGui import QPaintEvent, QPainter, QPixmap, QIntValidator, QFont, QColor, QPalette
+from PyQt5.QtWidgets import QWidget, QPushButton, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem, \
+    QScrollArea, QGroupBox, QSlider, QDialog, QLabel, QLineEdit, QCheckBox, QComboBox, QPlainTextEdit, QFileDialog, \
+    QDateEdit, QMenu, QActionGroup
 
 from hendjibi.tools.app_logger import get_logger
 from hendjibi.tools.translator import translate as _
+from hendjibi.model.covers import COVER_MAX_BYTES, COVER_MAX_DIMENSION, describe_savings, format_size, \
+    ingestion_pool, process_cover_file
 from hendjibi.model.entry import GenericEntry, EntryType, ProgressStatus, EntryStatus
+from hendjibi.model.filters import Attr, Not, Or, bits_to_bitmap, iter_bits
+from hendjibi.model.sorting import SortOrder
+from hendjibi.pyqt.cover_view import CoverDelegate, CoverListView, EntryListModel, ENTRY_ROLE
 from hendjibi.pyqt.qt_layout import FlowLayout
+from hendjibi.pyqt.thumbnails import ThumbnailLoader
 from hendjibi.tools.config import SLIDER_MAX, SLIDER_MIN
+from hendjibi.tools.thumbnail_cache import ThumbnailCache
+from hendjibi.tools.tracing import traced
 
 logger = get_logger(__name__)
 
@@ -16,6 +30,16 @@ BOLD_FONT = QFont()
 BOLD_FONT.setBold(True)
 ALPHA1 = 15
 ALPHA2 = 50
+# horizontal space eaten by the entry type and progress status group box frames
+GROUP_NESTING_MARGIN = 48
+FRAME_INTERVAL_MS = 16
+# progress status views resized per idle pass once the visible ones are done
+RESIZE_CHUNK_SIZE = 4
+SEARCH_RESULTS_LIMIT = 50
+POPULATE_CHUNK_SIZE = 200
+# seconds of each event loop pass spent on adding entries while the library streams in
+POPULATE_TIME_BUDGET = 0.008
+SEARCH_RESULTS_HEIGHT = 150
 
 
 def create_palette(qcolor):
@@ -44,16 +68,6 @@ MAP_PROGRESS_STATUS_TO_BG_COLOR = {
 }
 
 
-class IconButton(QToolButton):
-    def __init__(self, data_entry, parent=None):
-        QToolButton.__init__(self, parent)
-        self.data_entry = data_entry
-        self.setText(repr(data_entry))
-
-    def mouseDoubleClickEvent(self, a0) -> None:
-        print(F"double pressed [{repr(self.data_entry)}]")
-
-
 class ListWidget(QListWidget):
     def __init__(self, default_string=_('No Items')):
         QListWidget.__init__(self)
@@ -68,10 +82,31 @@ class ListWidget(QListWidget):
 
 
 class MainWidget(QWidget):
+    population_progress = pyqtSignal(int, int)
+    # (entry, changes) from the data manager, queued when the edit happened on another thread
+    entry_changed = pyqtSignal(object, object)
+
     def connect_actions(self, show_msg_on_status_bar):
         self.show_msg_on_status_bar = show_msg_on_status_bar
 
-    def add_entry(self, entry):
+    def _create_progress_status_box(self, entry):
+        progress_status_box = QGroupBox(entry.progress_status.value)
+        progress_status_box.setFont(BOLD_FONT)
+        progress_status_box.setAutoFillBackground(True)
+        progress_status_box.setPalette(MAP_PROGRESS_STATUS_TO_BG_COLOR[entry.progress_status])
+        progress_layout = QVBoxLayout()
+        progress_status_box.setLayout(progress_layout)
+        view = CoverListView(EntryListModel(self.data_manager.get_cover, self.thumbnail_loader, self.sort_index,
+                                            self), self.cover_delegate)
+        view.set_available_width(self._available_width())
+        view.doubleClicked.connect(self.entry_double_clicked)
+        view.setContextMenuPolicy(Qt.CustomContextMenu)
+        view.customContextMenuRequested.connect(lambda position: self.entry_context_menu(view, position))
+        progress_layout.addWidget(view)
+        view.update_tile_size()
+        return progress_status_box, view
+
+    def _get_view(self, entry):
         if entry.entry_type.value not in self.group_boxes:
             entry_type_box = QGroupBox(entry.entry_type.value)
             entry_type_box.setFont(BOLD_FONT)
@@ -80,62 +115,156 @@ class MainWidget(QWidget):
             layout = FlowLayout()
             entry_type_box.setLayout(layout)
             self.group_boxes[entry.entry_type.value] = (entry_type_box, layout, dict())
-            progress_status_box = QGroupBox(entry.progress_status.value)
-            progress_status_box.setFont(BOLD_FONT)
-            progress_status_box.setAutoFillBackground(True)
-            progress_status_box.setPalette(MAP_PROGRESS_STATUS_TO_BG_COLOR[entry.progress_status])
-            progress_layout = FlowLayout()
-            progress_status_box.setLayout(progress_layout)
-            layout.addWidget(progress_status_box)
-            self.group_boxes[entry.entry_type.value][2][entry.progress_status.value] = (progress_status_box, progress_layout)
-            self.container_layout.addWidget(entry_type_box)
-        if entry.progress_status.value not in self.group_boxes[entry.entry_type.value][2]:
-            progress_status_box = QGroupBox(entry.progress_status.value)
-            progress_status_box.setFont(BOLD_FONT)
-            progress_status_box.setAutoFillBackground(True)
-            progress_status_box.setPalette(MAP_PROGRESS_STATUS_TO_BG_COLOR[entry.progress_status])
-            progress_layout = FlowLayout()
-            progress_status_box.setLayout(progress_layout)
-            self.group_boxes[entry.entry_type.value][1].addWidget(progress_status_box)
-            self.group_boxes[entry.entry_type.value][2][entry.progress_status.value] = (progress_status_box, progress_layout)
-        button = IconButton(entry, self)
-        button.setToolButtonStyle(Qt.ToolButtonTextUnderIcon)
-        qp = QPixmap()
-        qp.loadFromData(entry.cover_image)
-        button.setIcon(QIcon(qp))
-        self.change_cover_size(None, button)
-        self.group_boxes[entry.entry_type.value][2][entry.progress_status.value][1].addWidget(button)
-
+            self.container_layout.insertWidget(self.container_layout.count() - 1, entry_type_box)
+        type_boxes = self.group_boxes[entry.entry_type.value]
+        if entry.progress_status.value not in type_boxes[2]:
+            progress_status_box, view = self._create_progress_status_box(entry)
+            type_boxes[1].addWidget(progress_status_box)
+            type_boxes[2][entry.progress_status.value] = (progress_status_box, view)
+        return type_boxes[2][entry.progress_status.value][1]
+
+    @traced()
+    def add_entries(self, entries):
+        query = self.filter_query()
+        filter_index = self.data_manager.filter_index
+        batches = {}
+        hidden = []
+        positions = []
+        for entry in entries:
+            view = self._get_view(entry)
+            batches.setdefault(view, []).append(entry)
+            position = filter_index.position(entry)
+            positions.append(position)
+            if not query.matches(entry):
+                hidden.append((view, entry, position))
+        for view, batch in batches.items():
+            view.model().add_entries(batch)
+            for entry in batch:
+                self._entry_views[entry.uid] = (entry.entry_type.value, view)
+        for view, entry, position in hidden:
+            view.set_row_hidden(view.model().row_of(entry), True)
+        self._hidden_bits |= bits_to_bitmap(position for view, entry, position in hidden)
+        self._shown_bits |= bits_to_bitmap(positions)
+        for type_name in {entry.entry_type.value for entry in entries}:
+            self._update_group_visibility(type_name)
+
+    @traced()
+    def add_entry(self, entry):
+        self.add_entries([entry])
+
+    def _update_group_visibility(self, type_name):
+        entry_type_box, flow_layout, inner_dict = self.group_boxes[type_name]
+        any_visible = False
+        for progress_status_box, view in inner_dict.values():
+            is_visible = view.model().rowCount() > len(view.hidden_uids)
+            progress_status_box.setVisible(is_visible)
+            any_visible = any_visible or is_visible
+        entry_type_box.setVisible(any_visible)
+
+    @traced()
     def load_with_data(self):
         for i in reversed(range(self.main_layout.count())):
             self.main_layout.itemAt(i).widget().deleteLater()
         for k, v in self.group_boxes.items():
-            group_box, flow_layout = v
+            group_box, flow_layout, inner_dict = v
             group_box.deleteLater()
-            for i in range(flow_layout.count()):
-                flow_layout.itemAt(i).widget().deleteLater()
-            flow_layout.deleteLater()
+        self.group_boxes = {}
+        self._entry_views = {}
 
-        for entry in self.data_manager.iterate_entries():
-            self.add_entry(entry)
-        ##
         self.container_layout.addStretch()
         self.container.setLayout(self.container_layout)
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setWidget(self.container)
-        self.main_layout.addWidget(scroll_area)
+        self.scroll_area = QScrollArea()
+        self.scroll_area.setWidgetResizable(True)
+        self.scroll_area.setWidget(self.container)
+        self.main_layout.addWidget(self.scroll_area)
+        self.start_population()
+
+    def start_population(self):
+        self.population_total = len(self.data_manager.all_entries)
+        self.population_done = 0
+        self._population_started = time.perf_counter()
+        # entries come in sort order, so every batch is appended to the end of its views
+        self._population = iter(list(self.sort_index))
+        # the first screenful is added right away, the rest streams in from the event loop
+        tile = self.cover_delegate.tile_size(self.fontMetrics())
+        screenful = (self.config.width // tile.width() + 1) * (self.config.height // tile.height() + 1)
+        self._populate_batch(max(screenful, POPULATE_CHUNK_SIZE))
+        if self.population_done < self.population_total:
+            self.population_timer.start()
+
+    def _populate_batch(self, count):
+        entries = list(itertools.islice(self._population, count))
+        if entries:
+            self.add_entries(entries)
+            self.population_done += len(entries)
+        self.population_progress.emit(self.population_done, self.population_total)
+        return len(entries) == count
+
+    @traced()
+    def _populate_next_batches(self):
+        deadline = time.perf_counter() + POPULATE_TIME_BUDGET
+        while time.perf_counter() < deadline:
+            if not self._populate_batch(POPULATE_CHUNK_SIZE):
+                self.population_timer.stop()
+                elapsed = time.perf_counter() - self._population_started
+                logger.info(_(F'Populated {self.population_done} entries in {elapsed:.2f}s'))
+                return
 
     def __init__(self, config, data_manager):
         QWidget.__init__(self)
         self.show_msg_on_status_bar = None
         self.group_boxes = {}
+        self._entry_views = {}  # uid -> (entry type name, view) of the tile showing the entry
+        self.hidden_types = set()
+        self.hidden_progress_statuses = set()
+        self.hidden_entry_statuses = set()
+        self.hide_nsfw = config.hide_nsfw
+        self._hidden_bits = 0
+        self._shown_bits = 0
+        self._population = iter(())
+        self.population_total = 0
+        self.population_done = 0
+        self._population_started = 0.0
+        self.population_timer = QTimer(self)
+        self.population_timer.setInterval(0)
+        self.population_timer.timeout.connect(self._populate_next_batches)
+        self.scroll_area = None
         self.container = QWidget()
         self.container_layout = QVBoxLayout()
         self.config = config
         self.data_manager = data_manager  # type: DataManager
+        try:
+            sort_order = SortOrder(self.config.sort_order)
+        except ValueError:
+            sort_order = SortOrder.DATE_ADDED
+        self.sort_index = self.data_manager.sort_index(sort_order)
+        self.cover_delegate = CoverDelegate(self.config.slider, self)
+        disk_cache = None
+        if self.config.thumbnail_cache_mb > 0:
+            disk_cache = ThumbnailCache(os.path.join(os.path.dirname(self.config.data_dump_path), 'thumbnails'),
+                                        self.config.thumbnail_cache_mb * 1024 * 1024)
+        self.thumbnail_loader = ThumbnailLoader(self.config.slider, disk_cache,
+                                                self.config.pixmap_cache_mb * 1024 * 1024, self)
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(FRAME_INTERVAL_MS)
+        self.resize_timer.timeout.connect(self.apply_cover_size)
+        self.idle_resize_timer = QTimer(self)
+        self.idle_resize_timer.setInterval(0)
+        self.idle_resize_timer.timeout.connect(self._resize_next_chunk)
+        self._views_to_resize = deque()
 
         self.root_layout = QVBoxLayout(self)
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText(_('Search titles, synonyms and descriptions'))
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(self.search_changed)
+        self.root_layout.addWidget(self.search_box)
+        self.search_results = ListWidget(_('No matches'))
+        self.search_results.setMaximumHeight(SEARCH_RESULTS_HEIGHT)
+        self.search_results.itemActivated.connect(self.search_result_activated)
+        self.search_results.hide()
+        self.root_layout.addWidget(self.search_results)
         self.cover_size_slider = QSlider(Qt.Horizontal)
         self.cover_size_slider.setMinimum(SLIDER_MIN)
         self.cover_size_slider.setMaximum(SLIDER_MAX)
@@ -146,79 +275,245 @@ class MainWidget(QWidget):
         self.root_layout.addLayout(self.main_layout)
 
         self.load_with_data()
+        self.entry_changed.connect(self.refresh_entry)
+        self.data_manager.subscribe(self.entry_changed.emit)
+        self.config.subscribe('hide_nsfw', self.filter_nsfw_changed)
+        self.config.subscribe('pixmap_cache_mb', self.pixmap_cache_size_changed)
 
         self.setLayout(self.root_layout)
 
+    def pixmap_cache_size_changed(self, size_mb):
+        self.thumbnail_loader.pixmaps.set_max_bytes(size_mb * 1024 * 1024)
+
+    def iterate_views(self):
+        for entry_type_box, flow_layout, inner_dict in self.group_boxes.values():
+            for progress_status_box, view in inner_dict.values():
+                yield view
+
+    def _available_width(self):
+        if self.scroll_area is None:
+            return self.width()
+        return self.scroll_area.viewport().width() - GROUP_NESTING_MARGIN
+
+    def resizeEvent(self, e) -> None:
+        QWidget.resizeEvent(self, e)
+        available_width = self._available_width()
+        for view in self.iterate_views():
+            view.set_available_width(available_width)
+
+    def search_changed(self, text):
+        self.search_results.clear()
+        if not text.strip():
+            self.search_results.hide()
+            return
+        for entry in self.data_manager.search(text, SEARCH_RESULTS_LIMIT):
+            item = QListWidgetItem(F'{entry} [{entry.entry_type.value}, {entry.progress_status.value}]')
+            item.setData(ENTRY_ROLE, entry)
+            self.search_results.addItem(item)
+        self.search_results.show()
+
+    def search_result_activated(self, item):
+        entry = item.data(ENTRY_ROLE)
+        type_boxes = self.group_boxes.get(entry.entry_type.value)
+        if type_boxes is None or entry.progress_status.value not in type_boxes[2]:
+            return
+        view = type_boxes[2][entry.progress_status.value][1]
+        model = view.model()
+        index = model.index(model.row_of(entry))
+        view.setCurrentIndex(index)
+        rect = view.visualRect(index)
+        center = view.viewport().mapTo(self.container, rect.center())
+        self.scroll_area.ensureVisible(center.x(), center.y(), rect.width(), rect.height())
+
+    def entry_double_clicked(self, index):
+        self.data_manager.add_one_progress(index.data(ENTRY_ROLE))
+
+    def entry_context_menu(self, view, position):
+        index = view.indexAt(position)
+        if not index.isValid():
+            return
+        entry = index.data(ENTRY_ROLE)
+        menu = QMenu(self)
+        add_progress = menu.addAction(_('Add one progress'))
+        add_progress.triggered.connect(lambda: self.data_manager.add_one_progress(entry))
+        for title, enum_type, current, change in (
+                (_('Progress status'), ProgressStatus, entry.progress_status,
+                 lambda value: self.data_manager.set_fields(entry, progress_status=value)),
+                (_('Entry status'), EntryStatus, entry.entry_status,
+                 lambda value: self.data_manager.set_status(entry, value)),
+                (_('Entry type'), EntryType, entry.entry_type,
+                 lambda value: self.data_manager.set_fields(entry, entry_type=value))):
+            submenu = menu.addMenu(title)
+            group = QActionGroup(submenu)
+            for value in enum_type:
+                action = submenu.addAction(value.value)
+                action.setCheckable(True)
+                action.setChecked(value is current)
+                action.setActionGroup(group)
+                action.triggered.connect(lambda checked, value=value, change=change: change(value))
+        menu.exec_(view.viewport().mapToGlobal(position))
+
+    def _set_filter(self, hidden_values, value, is_checked):
+        if is_checked is (value not in hidden_values):
+            return
+        if is_checked is True:
+            hidden_values.discard(value)
+        else:
+            hidden_values.add(value)
+        self.apply_filters()
+
     def filter_type_changed(self, entry_name, is_checked):
-        if entry_name in self.group_boxes:
-            group = self.group_boxes[entry_name][0]
-            if is_checked is True:
-                group.show()
-            else:
-                group.hide()
+        self._set_filter(self.hidden_types, EntryType(entry_name), is_checked)
 
     def filter_status_changed(self, entry_name, is_checked):
-        for entry_type in EntryType:
-            if entry_type.value in self.group_boxes:
-                if entry_name in self.group_boxes[entry_type.value][2]:
-                    group = self.group_boxes[entry_type.value][2][entry_name][0]
-                    if is_checked is True:
-                        group.show()
-                    else:
-                        group.hide()
+        self._set_filter(self.hidden_progress_statuses, ProgressStatus(entry_name), is_checked)
+
+    def filter_entry_status_changed(self, entry_name, is_checked):
+        self._set_filter(self.hidden_entry_statuses, EntryStatus(entry_name), is_checked)
+
+    def filter_nsfw_changed(self, hide_nsfw):
+        if hide_nsfw == self.hide_nsfw:
+            return
+        self.hide_nsfw = hide_nsfw
+        self.apply_filters()
+
+    def filter_query(self):
+        hidden = [Attr('entry_type', value) for value in self.hidden_types]
+        hidden += [Attr('progress_status', value) for value in self.hidden_progress_statuses]
+        hidden += [Attr('entry_status', value) for value in self.hidden_entry_statuses]
+        if self.hide_nsfw:
+            hidden.append(Attr('nsfw', True))
+        return Not(Or(*hidden))
+
+    def _view_for(self, entry):
+        return self.group_boxes[entry.entry_type.value][2][entry.progress_status.value][1]
+
+    @traced()
+    def apply_filters(self):
+        index = self.data_manager.filter_index
+        hidden_bits = self._shown_bits & ~self.filter_query().evaluate(index)
+        changed = hidden_bits ^ self._hidden_bits
+        # only rows whose visibility flipped are touched
+        for bit in iter_bits(changed & hidden_bits):
+            entry = index.entries[bit]
+            view = self._view_for(entry)
+            view.set_row_hidden(view.model().row_of(entry), True)
+        for bit in iter_bits(changed & self._hidden_bits):
+            entry = index.entries[bit]
+            view = self._view_for(entry)
+            view.set_row_hidden(view.model().row_of(entry), False)
+        self._hidden_bits = hidden_bits
+        for type_name in self.group_boxes:
+            self._update_group_visibility(type_name)
 
     def change_slider_action(self, on_release=True):
-        if on_release is True:
+        for signal in (self.cover_size_slider.valueChanged, self.cover_size_slider.sliderReleased):
             try:
-                self.cover_size_slider.valueChanged.disconnect()
-            except:
+                signal.disconnect()
+            except TypeError:
                 pass
-            finally:
-                self.cover_size_slider.sliderReleased.connect(self.change_cover_size)
+        if on_release is True:
+            self.cover_size_slider.sliderReleased.connect(self.change_cover_size)
         else:
-            try:
-                self.cover_size_slider.sliderReleased.disconnect()
-            except:
-                pass
-            finally:
-                self.cover_size_slider.valueChanged.connect(self.change_cover_size)
-
-    def refresh_entries(self):
-        pass
-
-    @staticmethod
-    def _resize_object(obj, max_size):
-        img_w = obj.iconSize().width()
-        img_h = obj.iconSize().height()
-        ratio_w_h = img_w / img_h
-        if img_w > img_h:
-            img_w = max_size
-            img_h = max_size / ratio_w_h
+            self.cover_size_slider.valueChanged.connect(self.schedule_cover_resize)
+            self.cover_size_slider.sliderReleased.connect(self.store_cover_size)
+
+    @traced()
+    def set_sort_order(self, order):
+        """Reorders every view from the maintained index of ``order``, without rebuilding any widget."""
+        order = SortOrder(order)
+        if order is self.sort_index.order:
+            return
+        self.config.sort_order = order.value
+        self.sort_index = self.data_manager.sort_index(order)
+        view_entries = defaultdict(list)
+        for entry in self.sort_index:
+            if entry.uid in self._entry_views:
+                view_entries[self._entry_views[entry.uid][1]].append(entry)
+        for view in self.iterate_views():
+            view.model().set_sort_index(self.sort_index, view_entries[view])
+        if self.population_timer.isActive():
+            # what is left to populate keeps being appended in the new order
+            self._population = iter([entry for entry in self.sort_index if entry.uid not in self._entry_views])
+
+    def refresh_entries(self, entries=None):
+        for entry in self.data_manager.iterate_entries() if entries is None else entries:
+            self.refresh_entry(entry)
+
+    @traced()
+    def refresh_entry(self, entry, changes=None):
+        """Brings the tile of ``entry`` up to date, moving it when its type or progress status changed.
+
+        Only the old and the new view are touched, whatever the size of the library.
+        """
+        if entry.uid not in self._entry_views:
+            # not populated yet, it is added with its current values
+            return
+        old_type_name, view = self._entry_views[entry.uid]
+        hidden = not self.filter_query().matches(entry)
+        new_view = self._get_view(entry)
+        if new_view is view and view.model().is_sorted(entry):
+            view.model().entry_changed(entry)
+            if hidden != view.is_hidden(entry):
+                view.set_row_hidden(view.model().row_of(entry), hidden)
         else:
-            img_h = max_size
-            img_w = max_size * ratio_w_h
-        obj.setIconSize(QSize(img_w, img_h))
-
-    def change_cover_size(self, _=None, obj=None):
+            # a new group or a new sort key, the tile is taken out and bisected back in
+            view.remove_entry(entry)
+            new_view.insert_entry(entry, hidden)
+            self._entry_views[entry.uid] = (entry.entry_type.value, new_view)
+            self._update_group_visibility(old_type_name)
+        bit = 1 << self.data_manager.filter_index.position(entry)
+        self._hidden_bits = self._hidden_bits | bit if hidden else self._hidden_bits & ~bit
+        self._update_group_visibility(entry.entry_type.value)
+
+    def schedule_cover_resize(self, _=None):
+        # slider ticks arriving within one frame are folded into a single resize
+        if not self.resize_timer.isActive():
+            self.resize_timer.start()
+
+    @traced()
+    def apply_cover_size(self):
+        self.cover_delegate.cover_size = self.cover_size_slider.value()
+        self.thumbnail_loader.set_thumbnail_size(self.cover_size_slider.value())
+        off_screen = deque()
+        for view in self.iterate_views():
+            if view.visibleRegion().isEmpty():
+                off_screen.append(view)
+            else:
+                view.update_tile_size()
+        self._views_to_resize = off_screen
+        if off_screen:
+            self.idle_resize_timer.start()
+
+    def _resize_next_chunk(self):
+        for i in range(RESIZE_CHUNK_SIZE):
+            if not self._views_to_resize:
+                self.idle_resize_timer.stop()
+                return
+            self._views_to_resize.popleft().update_tile_size()
+
+    def store_cover_size(self):
         self.config.slider = self.cover_size_slider.value()
-        icon_max_w_h = self.cover_size_slider.value()
-        if obj is not None:
-            self._resize_object(obj, icon_max_w_h)
-        else:
-            for k, v in self.group_boxes.items():
-                group_box, flow_layout, inner_dict = v
-                for k2, v2 in inner_dict.items():
-                    group_box2, flow_layout2 = v2
-                    for o in group_box2.children():
-                        if isinstance(o, IconButton):
-                            self._resize_object(o, icon_max_w_h)
+
+    @traced()
+    def change_cover_size(self, _=None):
+        self.store_cover_size()
+        self.apply_cover_size()
+
+
+class CoverSignals(QObject):
+    # finished cover ingestion future, delivered on the GUI thread
+    finished = pyqtSignal(object)
 
 
 class NewEntryDialog(QDialog):
-    def __init__(self, parent):
+    def __init__(self, parent, max_cover_dimension=COVER_MAX_DIMENSION, max_cover_bytes=COVER_MAX_BYTES):
         QDialog.__init__(self, parent)
         self.submitted = False
         self.cover_bytes = b''
+        self.max_cover_dimension = max_cover_dimension
+        self.max_cover_bytes = max_cover_bytes
+        self.cover_future = None
         self.setWindowTitle('Add new entry')
         self.container = QWidget()
         self.horizontal_layout = QHBoxLayout()
@@ -285,11 +580,13 @@ class NewEntryDialog(QDialog):
         self.cover = QLabel("Cover:")
         self.load_cover_button = QPushButton(_('Load cover'))
         self.load_cover_button.clicked.connect(self.load_image)
+        self.cover_info = QLabel('')
 
         self.accept_button = QPushButton(_('Add'))
 
         self.container_left_layout.addWidget(self.cover)
         self.container_left_layout.addWidget(self.load_cover_button)
+        self.container_left_layout.addWidget(self.cover_info)
 
         self.container_right_layout.addWidget(label_type)
         self.container_right_layout.addWidget(self.combo_type)
@@ -337,14 +634,56 @@ class NewEntryDialog(QDialog):
         self.close()
 
     def load_image(self):
-        fname = QFileDialog.getOpenFileName(self, 'Select entry cover')
-        image_path = fname[0]
-        self.cover_bytes = open(image_path, 'rb').read()
+        image_path, _selected_filter = QFileDialog.getOpenFileName(self, _('Select entry cover'))
+        if not image_path:
+            return
+        # the file is read, validated and downscaled in a worker process, the dialog stays responsive
+        # and the entry can be added once the cover is ready
+        self.discard_cover_future()
+        self.cover_info.setText(_('Processing cover...'))
+        self.accept_button.setEnabled(False)
+        # the signals object has no parent, Qt drops its connection if the dialog is destroyed first
+        signals = CoverSignals()
+        signals.finished.connect(self.cover_ready)
+        self.cover_future = ingestion_pool().submit(process_cover_file, image_path, self.max_cover_dimension,
+                                                    self.max_cover_bytes)
+        self.cover_future.add_done_callback(lambda future: signals.finished.emit(future))
+
+    def discard_cover_future(self):
+        # cancelling runs the done callback right away, cover_ready must already see it as stale
+        future, self.cover_future = self.cover_future, None
+        if future is not None:
+            future.cancel()
+
+    def done(self, result):
+        self.discard_cover_future()
+        QDialog.done(self, result)
+
+    def cover_ready(self, future):
+        if future is not self.cover_future or future.cancelled():
+            # superseded by another pick, or the dialog was closed
+            return
+        self.cover_future = None
+        self.accept_button.setEnabled(True)
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error(_(F'Could not load cover due to: {e}'))
+            self.cover_bytes = b''
+            self.cover.clear()
+            self.cover_info.setText(_(F'Not a usable image: {e}'))
+            return
+        self.cover_bytes = result.data
         qp = QPixmap()
         qp.loadFromData(self.cover_bytes)
         self.cover.setPixmap(qp)
         self.cover.setMaximumHeight(500)
         self.cover.setMaximumWidth(500)
+        if result.reencoded:
+            self.cover_info.setText(F'{result.width}x{result.height}, '
+                                    F'{describe_savings(result.original_size, len(result.data))}')
+        else:
+            self.cover_info.setText(F'{result.width}x{result.height}, {format_size(len(result.data))}')
 
     def get_values(self):
         entry_status = self.combo_status.currentData()
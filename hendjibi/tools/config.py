@@ -1,16 +1,24 @@
 import configparser
 import os
+import threading
+from collections import defaultdict
 from enum import Enum
 
 from hendjibi import PROJECT_NAME_SHORT
 from hendjibi.tools.app_logger import get_logger
 from hendjibi.tools.translator import translate as _
-from hendjibi.model.entry import ProgressStatus, EntryType
+from hendjibi.model.entry import ProgressStatus, EntryType, EntryStatus
 
 logger = get_logger(__name__)
 
 SLIDER_MIN = 50
 SLIDER_MAX = 250
+WRITE_DELAY = 1.0
+
+
+def entry_status_property(entry_status):
+    # EntryStatus and EntryType share value names, so status filters get their own prefix
+    return F'status_{entry_status.value.lower()}'
 
 
 class ConfigSection(Enum):
@@ -18,6 +26,7 @@ class ConfigSection(Enum):
     VIEW = 'View'
     PROGRESS_STATUS = ProgressStatus.__name__
     ENTRY_TYPE = EntryType.__name__
+    ENTRY_STATUS = EntryStatus.__name__
 
 
 class ConfigManager(object):
@@ -26,10 +35,22 @@ class ConfigManager(object):
         ('height', ConfigSection.MAIN, int, 600, 200, None),
         ('width', ConfigSection.MAIN, int, 800, 300, None),
         ('log_level', ConfigSection.MAIN, int, 2, 0, 5),
+        ('journaled_storage', ConfigSection.MAIN, bool, True, None, None),
+        ('journal_compact_threshold', ConfigSection.MAIN, int, 500, 10, None),
+        ('lazy_covers', ConfigSection.MAIN, bool, True, None, None),
+        ('storage_backend', ConfigSection.MAIN, str, 'pickle', None, None),
+        ('autosave_interval', ConfigSection.MAIN, int, 60, 0, None),
+        ('tracing', ConfigSection.MAIN, bool, False, None, None),
+        ('thumbnail_cache_mb', ConfigSection.MAIN, int, 256, 0, None),
+        ('pixmap_cache_mb', ConfigSection.MAIN, int, 128, 8, None),
+        ('cover_max_dimension', ConfigSection.MAIN, int, 1000, 100, None),
+        ('cover_max_kb', ConfigSection.MAIN, int, 400, 16, None),
         ('redraw_on_release', ConfigSection.VIEW, bool, False, None, None),
         ('stay_on_top', ConfigSection.VIEW, bool, False, None, None),
         ('dark_mode', ConfigSection.VIEW, bool, True, None, None),
+        ('hide_nsfw', ConfigSection.VIEW, bool, False, None, None),
         ('slider', ConfigSection.VIEW, int, 150, SLIDER_MIN, SLIDER_MAX),
+        ('sort_order', ConfigSection.VIEW, str, 'date_added', None, None),
     ]
 
     def __init__(self, cwd):
@@ -38,6 +59,10 @@ class ConfigManager(object):
             os.mkdir(path)
         self.config_path = os.path.join(path, F'{PROJECT_NAME_SHORT}.ini')
         self.config = configparser.ConfigParser()
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._write_timer = None
+        self._subscribers = defaultdict(list)
 
         try:
             self.config.read(self.config_path)
@@ -55,6 +80,9 @@ class ConfigManager(object):
         for entry_type in EntryType:
             name = entry_type.value.lower()
             ConfigManager.add_property(name, EntryType.__name__, bool, True)
+        for entry_status in EntryStatus:
+            name = entry_status_property(entry_status)
+            ConfigManager.add_property(name, EntryStatus.__name__, bool, True)
         self.read_config()
 
     @staticmethod
@@ -71,9 +99,13 @@ class ConfigManager(object):
                 if max_value is not None:
                     if value > max_value:
                         value = max_value
-            this.config.set(tag, name, str(value))
-            setattr(this, F'_{name}', value)
-            this.write_config()
+            with this._lock:
+                changed = this.config.get(tag, name, fallback=None) != str(value)
+                this.config.set(tag, name, str(value))
+                setattr(this, F'_{name}', value)
+            if changed:
+                this.schedule_write()
+                this.notify(name, value)
         getter_method = property(lambda x: getattr(x, F'_{name}'), setter_method)
         setattr(ConfigManager, F'_{name}', default_value)
         setattr(ConfigManager, name, getter_method)
@@ -81,10 +113,11 @@ class ConfigManager(object):
     def read_config(self):
         for property_to_read in ConfigManager.PROPERTIES:
             try:
-                if issubclass(property_to_read[2], int):
-                    v = self.config.getint(property_to_read[1].value, property_to_read[0])
-                elif issubclass(property_to_read[2], bool):
+                # bool is checked first as it is a subclass of int
+                if issubclass(property_to_read[2], bool):
                     v = self.config.getboolean(property_to_read[1].value, property_to_read[0])
+                elif issubclass(property_to_read[2], int):
+                    v = self.config.getint(property_to_read[1].value, property_to_read[0])
                 elif issubclass(property_to_read[2], str):
                     v = self.config.get(property_to_read[1].value, property_to_read[0])
                 else:
@@ -106,7 +139,53 @@ class ConfigManager(object):
                 setattr(self, prop_name, v)
             except (configparser.NoOptionError, ValueError):
                 setattr(self, prop_name, True)
+        for property_to_read in EntryStatus:
+            prop_name = entry_status_property(property_to_read)
+            try:
+                v = self.config.getboolean(EntryStatus.__name__, prop_name)
+                setattr(self, prop_name, v)
+            except (configparser.NoOptionError, ValueError):
+                setattr(self, prop_name, True)
+
+    def subscribe(self, name, callback):
+        self._subscribers[name].append(callback)
+
+    def unsubscribe(self, name, callback):
+        if callback in self._subscribers[name]:
+            self._subscribers[name].remove(callback)
+
+    def notify(self, name, value):
+        for callback in list(self._subscribers[name]):
+            try:
+                callback(value)
+            except Exception as e:
+                logger.error(_(F'Config subscriber for {name} failed due to: {e}'))
+
+    def schedule_write(self):
+        # changes are batched in memory and written once none was made for the delay
+        with self._lock:
+            self._dirty = True
+            if self._write_timer is not None:
+                self._write_timer.cancel()
+            self._write_timer = threading.Timer(WRITE_DELAY, self.flush)
+            self._write_timer.daemon = True
+            self._write_timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._write_timer is not None:
+                self._write_timer.cancel()
+                self._write_timer = None
+            if self._dirty:
+                self.write_config()
 
     def write_config(self):
-        with open(self.config_path, 'w') as configfile:
-            self.config.write(configfile)
+        with self._lock:
+            tmp_path = F'{self.config_path}.tmp'
+            try:
+                with open(tmp_path, 'w') as configfile:
+                    self.config.write(configfile)
+                os.replace(tmp_path, self.config_path)
+                self._dirty = False
+            except OSError as e:
+                logger.error(_(F'Could not write config file due to: {e}'))
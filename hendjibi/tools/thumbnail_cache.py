@@ -0,0 +1,97 @@
+import os
+import threading
+from collections import OrderedDict
+
+from hendjibi.tools.app_logger import get_logger
+from hendjibi.tools.config import SLIDER_MIN, SLIDER_MAX
+from hendjibi.tools.translator import translate as _
+
+logger = get_logger(__name__)
+
+THUMBNAIL_BUCKETS = (SLIDER_MIN, 100, 150, 200, SLIDER_MAX)
+
+
+def bucket_for(size):
+    for bucket in THUMBNAIL_BUCKETS:
+        if size <= bucket:
+            return bucket
+    return THUMBNAIL_BUCKETS[-1]
+
+
+class ThumbnailCache(object):
+    """On-disk cache of pre-scaled cover thumbnails keyed by cover hash and size bucket.
+
+    Least recently used files are removed once the cache grows past ``max_bytes``;
+    recency survives restarts through file modification times.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # (cover_hash, bucket) -> file size, oldest first
+        self._lock = threading.Lock()
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self._scan()
+
+    def _path(self, cover_hash, bucket):
+        return os.path.join(self.directory, F'{cover_hash}_{bucket}')
+
+    def _scan(self):
+        found = []
+        for entry in os.scandir(self.directory):
+            cover_hash, _sep, bucket = entry.name.rpartition('_')
+            if not entry.is_file() or not bucket.isdigit():
+                continue
+            stat = entry.stat()
+            found.append((stat.st_mtime, (cover_hash, int(bucket)), stat.st_size))
+        for mtime, key, size in sorted(found):
+            self._entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, cover_hash, bucket):
+        key = (cover_hash, bucket)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(cover_hash, bucket)
+        try:
+            with open(path, 'rb') as the_file:
+                data = the_file.read()
+            os.utime(path)
+            return data
+        except OSError:
+            with self._lock:
+                self.total_bytes -= self._entries.pop(key, 0)
+            return None
+
+    def put(self, cover_hash, bucket, data):
+        key = (cover_hash, bucket)
+        path = self._path(cover_hash, bucket)
+        tmp_path = F'{path}.tmp'
+        try:
+            with open(tmp_path, 'wb') as the_file:
+                the_file.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(_(F'Failed to write thumbnail {path}, runtime error is: {e}'))
+            return
+        with self._lock:
+            self.total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._entries:
+            (cover_hash, bucket), size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(cover_hash, bucket))
+            except OSError:
+                pass
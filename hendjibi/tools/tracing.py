@@ -0,0 +1,144 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from hendjibi.tools.app_logger import get_logger
+from hendjibi.tools.translator import translate as _
+
+logger = get_logger(__name__)
+
+TRACE_ENV_VAR = 'HENDJIBI_TRACE'
+TRACE_FILE_NAME = 'trace.json'
+
+_tracer = None
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.record(self.name, self.start, time.perf_counter_ns() - self.start, self.args)
+        return False
+
+
+class Tracer(object):
+    """Collects finished spans and writes them as Chrome trace events (chrome://tracing, Perfetto)."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.events = []
+        self._origin = time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    def record(self, name, start, duration, args):
+        # list.append is atomic, spans may finish on worker threads
+        self.events.append((name, start, duration, threading.get_ident(), args))
+
+    def chrome_trace(self):
+        trace_events = []
+        for name, start, duration, thread_id, args in self.events:
+            event = {'name': name, 'cat': 'hendjibi', 'ph': 'X', 'pid': self._pid, 'tid': thread_id,
+                     'ts': (start - self._origin) / 1000, 'dur': duration / 1000}
+            if args:
+                event['args'] = {key: str(value) for key, value in args.items()}
+            trace_events.append(event)
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def summary(self):
+        durations = defaultdict(list)
+        for name, start, duration, thread_id, args in self.events:
+            durations[name].append(duration / 1e6)
+        lines = [F'{"span":<40} {"count":>8} {"total ms":>12} {"mean ms":>10} {"max ms":>10}']
+        for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+            lines.append(F'{name:<40} {len(values):>8} {sum(values):>12.3f} {sum(values) / len(values):>10.3f} '
+                         F'{max(values):>10.3f}')
+        return '\n'.join(lines)
+
+    def write(self):
+        tmp_path = F'{self.file_path}.tmp'
+        with open(tmp_path, 'w') as the_file:
+            json.dump(self.chrome_trace(), the_file)
+        os.replace(tmp_path, self.file_path)
+
+
+def is_enabled():
+    return _tracer is not None
+
+
+def span(name, **args):
+    """Times the enclosed block, a shared no-op context manager is returned while tracing is off."""
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(_tracer, name, args)
+
+
+def traced(name=None):
+    def decorator(function):
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+            with _Span(_tracer, span_name, None):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def init_tracing(directory, enabled=False):
+    """Starts tracing when ``enabled`` (the config flag) is set or the environment variable asks for it.
+
+    The variable may hold the trace file path, any other value only switches tracing on.
+    """
+    global _tracer
+    env_value = os.environ.get(TRACE_ENV_VAR, '')
+    if not enabled and env_value.lower() in ('', '0', 'false', 'no'):
+        return None
+    file_path = os.path.join(directory, TRACE_FILE_NAME)
+    if env_value.lower().endswith('.json'):
+        file_path = env_value
+    _tracer = Tracer(file_path)
+    atexit.register(finish_tracing)
+    logger.info(_(F'Tracing enabled, spans are written to {file_path}'))
+    return _tracer
+
+
+def finish_tracing():
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    try:
+        tracer.write()
+    except OSError as e:
+        logger.error(_(F'Could not write trace file due to: {e}'))
+    summary = tracer.summary()
+    logger.info(_(F'Trace summary:\n{summary}'))
+    return summary